@@ -1,9 +1,18 @@
+import itertools
+import os
+
 from dslabmp import Context, Message, Process
 
+try:
+    from dslaboutbox import Outbox
+except ImportError:
+    Outbox = None
+
 
 # AT MOST ONCE ---------------------------------------------------------------------------------------------------------
 
-MESSAGE_ORDER_LIMIT_AMO = 3
+# the receiver remembers received orders within a window of this size above its lower bound
+MESSAGE_ORDER_LIMIT_AMO = 256
 
 
 class AtMostOnceSender(Process):
@@ -31,7 +40,8 @@ class AtMostOnceReceiver(Process):
     def __init__(self, proc_id: str):
         self._id = proc_id
         self._order_lower_bound = 0
-        self._order_store = set()
+        # bit i is set if order _order_lower_bound + i is received, bit 0 is always clear
+        self._received = 0
 
     def on_local_message(self, msg: Message, ctx: Context):
         # not used in this task
@@ -40,27 +50,208 @@ class AtMostOnceReceiver(Process):
     def on_message(self, msg: Message, sender: str, ctx: Context):
         # process messages from receiver
         # deliver message to local user with ctx.send_local()
-        order = msg["order"]
-        if order >= self._order_lower_bound and order not in self._order_store:
-            self._order_store.add(order)
-            msg.remove("order")
-            ctx.send_local(msg)
-        if all(
-            cur_order in self._order_store
-            for cur_order in range(order - MESSAGE_ORDER_LIMIT_AMO, order)
-        ):
-            for order_to_remove in range(self._order_lower_bound, order + 1):
-                self._order_store.discard(order_to_remove)
-            self._order_lower_bound = order + 1
+        offset = msg["order"] - self._order_lower_bound
+        if offset < 0 or (self._received >> offset) & 1:
+            return
+        if offset >= MESSAGE_ORDER_LIMIT_AMO:
+            # slide the window forward, messages left below it are dropped if they arrive later
+            shift = offset - MESSAGE_ORDER_LIMIT_AMO + 1
+            self._received >>= shift
+            self._order_lower_bound += shift
+            offset -= shift
+        self._received |= 1 << offset
+        msg.remove("order")
+        ctx.send_local(msg)
+        # skip the run of received orders starting at the lower bound
+        delivered = (~self._received & (self._received + 1)).bit_length() - 1
+        self._received >>= delivered
+        self._order_lower_bound += delivered
 
     def on_timer(self, timer_name: str, ctx: Context):
         # process fired timers here
         pass
 
 
+# RETRANSMISSION TIMEOUT -----------------------------------------------------------------------------------------------
+
+RTO_MIN = 2
+RTO_MAX = 64
+RTT_ALPHA = 1 / 8
+RTT_BETA = 1 / 4
+# weight of the RTT variance in the timeout as in RFC 6298, the timeout then rarely fires for a message
+# that is not lost, late deliveries are repaired earlier by resending overdue messages along with new ones
+RTT_K = 4
+CLOCK_GRANULARITY = 1
+
+
+class _RttEstimator:
+    # smoothed RTT and its variance (Jacobson) measured with one message at a time as a probe, retransmitted
+    # messages are never sampled (Karn) and the next message sent after a retransmitted probe becomes the probe.
+    # The timeout is doubled on retransmissions and restored from the estimate by any new ack, as in TCP,
+    # but only while no acks come for a whole timeout: losses of single messages on a live link are not backed off.
+    # A retransmission is counted as spurious if its ack comes faster than any RTT seen so far,
+    # then the ack was sent for the original message. Times of the last transmission of unacknowledged messages
+    # are kept in sent_at, a message is overdue once it is not acknowledged for a smoothed RTT after it.
+    __slots__ = (
+        "srtt", "rttvar", "rto", "base_rto", "min_rtt", "probe_order", "probe_time", "sent_at",
+        "ack_time", "backoff_time", "retransmit_order", "retransmit_time", "retransmits", "spurious",
+    )
+
+    def __init__(self, initial_rto: float):
+        self.srtt = None
+        self.rttvar = None
+        self.rto = initial_rto
+        self.base_rto = initial_rto
+        self.min_rtt = None
+        self.probe_order = None
+        self.probe_time = None
+        self.sent_at = dict()
+        self.ack_time = None
+        self.backoff_time = None
+        self.retransmit_order = None
+        self.retransmit_time = None
+        self.retransmits = 0
+        self.spurious = 0
+
+    def on_send(self, order: int, time: float):
+        self.sent_at[order] = time
+        if self.probe_order is None:
+            self.probe_order = order
+            self.probe_time = time
+
+    def on_retransmit(self, order: int, time: float):
+        self.sent_at[order] = time
+        self.retransmits += 1
+        if order == self.probe_order:
+            self.probe_order = None
+        self.retransmit_order = order
+        self.retransmit_time = time
+
+    def overdue(self, order: int, time: float) -> bool:
+        sent_at = self.sent_at.get(order)
+        return sent_at is not None and self.srtt is not None and time - sent_at >= self.srtt
+
+    def stalled(self, time: float) -> bool:
+        # whether no acks came for a whole timeout, otherwise the link is alive and only single messages are lost
+        return self.ack_time is None or time >= self.ack_time + self.rto
+
+    def resend_timeout(self, time: float) -> float:
+        # a resent message is taken as lost again after a smoothed RTT while acks keep coming,
+        # the backed off timeout is used once the link stalls
+        if self.srtt is None or self.stalled(time):
+            return self.rto
+        return self.srtt
+
+    def on_timeout(self, time: float):
+        if not self.stalled(time):
+            return
+        # several timers may expire for one loss, back off once per timeout period
+        if self.backoff_time is not None and time < self.backoff_time + self.rto / 2:
+            return
+        self.rto = min(self.rto * 2, RTO_MAX)
+        self.backoff_time = time
+
+    def on_ack(self, order: int, time: float):
+        # called once for every message when it is acknowledged for the first time
+        self.sent_at.pop(order, None)
+        if order == self.probe_order:
+            self._sample(time - self.probe_time)
+            self.probe_order = None
+        if order == self.retransmit_order:
+            if self.min_rtt is not None and time - self.retransmit_time < self.min_rtt:
+                self.spurious += 1
+            self.retransmit_order = None
+        self.rto = self.base_rto
+        self.ack_time = time
+        self.backoff_time = None
+
+    def stats(self) -> dict:
+        return {"srtt": self.srtt, "rto": self.rto, "retransmits": self.retransmits, "spurious": self.spurious}
+
+    def _sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+        self.base_rto = min(max(self.srtt + max(CLOCK_GRANULARITY, RTT_K * self.rttvar), RTO_MIN), RTO_MAX)
+
+
+# FRAMES ---------------------------------------------------------------------------------------------------------------
+
+# messages sent at once are packed into frames of consecutive orders with up to BATCH_MAX_MESSAGES messages
+# and BATCH_MAX_BYTES of UTF-8 encoded text, a sender waits up to BATCH_LINGER for more local messages before sending
+# a frame that is not full (0 sends at once, frames are then formed only from messages delayed by the window)
+BATCH_MAX_MESSAGES = 16
+BATCH_MAX_BYTES = 1024
+BATCH_LINGER = 0
+
+
+def _send_frames(orders, message_store: dict, receiver: str, ctx: Context, max_messages: int = BATCH_MAX_MESSAGES):
+    # orders are ascending, a frame holding a single message is sent as a plain message
+    frame = []
+    size = 0
+    for order in orders:
+        text_size = len(message_store[order].encode("utf8"))
+        if frame and (
+            order != frame[0] + len(frame)
+            or len(frame) == max_messages
+            or size + text_size > BATCH_MAX_BYTES
+        ):
+            _send_frame(frame, message_store, receiver, ctx)
+            frame = []
+            size = 0
+        frame.append(order)
+        size += text_size
+    if frame:
+        _send_frame(frame, message_store, receiver, ctx)
+
+
+def _send_frame(frame: list, message_store: dict, receiver: str, ctx: Context):
+    if len(frame) == 1:
+        msg = Message("MESSAGE", {"text": message_store[frame[0]], "order": frame[0]})
+    else:
+        msg = Message("FRAME", {"order": frame[0], "texts": [message_store[order] for order in frame]})
+    ctx.send(msg, receiver)
+
+
+def _batch_full(message_store: dict, first: int, end: int) -> bool:
+    # whether unsent messages with orders in [first, end) fill a frame
+    if end - first >= BATCH_MAX_MESSAGES:
+        return True
+    return sum(len(message_store.get(order, "").encode("utf8")) for order in range(first, end)) >= BATCH_MAX_BYTES
+
+
+def _unpack(msg: Message):
+    # (order, text) pairs of a message or a frame
+    if msg.type == "FRAME":
+        return enumerate(msg["texts"], msg["order"])
+    return ((msg["order"], msg["text"]),)
+
+
+# OUTBOX ---------------------------------------------------------------------------------------------------------------
+
+# directory for persistent logs of unacknowledged messages of ALO and EO senders, None keeps them in memory only.
+# A sender restarted with the same id recovers its messages from the log and resends them as soon as it is started.
+OUTBOX_DIR = None
+# the log is flushed to disk once per OUTBOX_GROUP_SIZE records
+OUTBOX_GROUP_SIZE = 64
+
+
+def _open_outbox(proc_id: str):
+    if Outbox is None:
+        raise ImportError('OUTBOX_DIR requires the dslaboutbox module')
+    return Outbox(os.path.join(OUTBOX_DIR, proc_id + ".outbox"), group_size=OUTBOX_GROUP_SIZE)
+
+
 # AT LEAST ONCE --------------------------------------------------------------------------------------------------------
 
+# initial retransmission timeout
 DELAY_ALO = 4
+# up to this many overdue messages are repeated in the frame of new messages
+BUNDLE_MAX_MESSAGES = 4
 
 
 class AtLeastOnceSender(Process):
@@ -68,29 +259,120 @@ class AtLeastOnceSender(Process):
         self._id = proc_id
         self._receiver = receiver_id
         self._order = 0
+        self._next_send = 0
         self._message_store = dict()
+        self._rtt = _RttEstimator(DELAY_ALO)
+        self._outbox = None
+        if OUTBOX_DIR is not None:
+            self._outbox = _open_outbox(proc_id)
+            self._message_store = self._outbox.messages()
+            self._order = self._outbox.next_order
+            self._next_send = min(self._message_store, default=self._order)
+
+    def on_start(self, ctx: Context):
+        # messages recovered from the outbox are resent at once, the flush sets their retransmission timers
+        if self._message_store:
+            self._flush(ctx)
 
     def on_local_message(self, msg: Message, ctx: Context):
         # receive message for delivery from local user
+        if msg.type == "STATS":
+            ctx.send_local(Message("STATS", self._rtt.stats()))
+            return
         self._message_store[self._order] = msg["text"]
-        msg["order"] = self._order
-        ctx.send(msg, self._receiver)
-        ctx.set_timer(str(self._order), DELAY_ALO)
+        if self._outbox is not None:
+            self._outbox.put(self._order, msg["text"])
         self._order += 1
+        if BATCH_LINGER > 0 and not _batch_full(self._message_store, self._next_send, self._order):
+            ctx.set_timer_once("linger", BATCH_LINGER)
+            return
+        self._flush(ctx)
 
     def on_message(self, msg: Message, sender: str, ctx: Context):
-        # process messages from receiver here
-        self._message_store.pop(msg["order"], None)
+        # process messages from receiver here, a frame is acked by its first order and size,
+        # a bundle also by orders of the repeated messages
+        first = msg["order"]
+        count = msg["count"] if msg.type != "MESSAGE" else 1
+        orders = list(range(first, first + count))
+        if msg.type == "BUNDLE":
+            orders += msg["resent"]
+        for order in orders:
+            if self._message_store.pop(order, None) is not None:
+                self._rtt.on_ack(order, ctx.time())
+                ctx.cancel_timer(str(order))
+                if self._outbox is not None:
+                    self._outbox.ack(order)
 
     def on_timer(self, timer_name: str, ctx: Context):
         # process fired timers here
+        if timer_name == "linger":
+            self._flush(ctx)
+            return
+        if timer_name == "probe":
+            # there are no new messages to carry overdue ones, they are repeated in a bundle of their own
+            overdue = self._overdue(ctx.time())
+            if overdue:
+                self._send_bundle([], overdue, ctx)
+            self._set_probe(ctx)
+            return
         order = int(timer_name)
         if order in self._message_store:
             msg = Message(
                 "MESSAGE", {"text": self._message_store[order], "order": order}
             )
             ctx.send(msg, self._receiver)
-            ctx.set_timer(timer_name, DELAY_ALO)
+            self._rtt.on_timeout(ctx.time())
+            self._rtt.on_retransmit(order, ctx.time())
+            ctx.set_timer(timer_name, self._rtt.rto)
+
+    def _flush(self, ctx: Context):
+        # messages recovered from the outbox may have gaps of acknowledged orders
+        orders = [order for order in range(self._next_send, self._order) if order in self._message_store]
+        if self._outbox is not None:
+            self._outbox.commit()
+        time = ctx.time()
+        overdue = self._overdue(time) if orders else []
+        count = 0
+        if overdue:
+            # the first frame of new messages repeats overdue ones
+            count = 1
+            while count < len(orders) and orders[count] == orders[0] + count and count < BATCH_MAX_MESSAGES:
+                count += 1
+            self._send_bundle(orders[:count], overdue, ctx)
+        _send_frames(orders[count:], self._message_store, self._receiver, ctx)
+        for order in orders:
+            self._rtt.on_send(order, time)
+            ctx.set_timer(str(order), self._rtt.rto)
+        self._next_send = self._order
+        ctx.cancel_timer("linger")
+        self._set_probe(ctx)
+
+    def _send_bundle(self, orders: list, overdue: list, ctx: Context):
+        # a frame of consecutive new messages that repeats overdue ones, it is acked with orders of both
+        msg = Message("BUNDLE", {
+            "order": orders[0] if orders else self._order,
+            "texts": [self._message_store[order] for order in orders],
+            "resent": [[order, self._message_store[order]] for order in overdue],
+        })
+        ctx.send(msg, self._receiver)
+        for order in overdue:
+            self._rtt.on_retransmit(order, ctx.time())
+
+    def _set_probe(self, ctx: Context):
+        # the probe fires when no new messages were sent for a smoothed RTT while some are unacknowledged
+        if self._message_store and self._rtt.srtt is not None:
+            ctx.set_timer("probe", self._rtt.srtt)
+
+    def _overdue(self, time: float) -> list:
+        # the oldest unacknowledged messages that were sent a smoothed RTT ago or earlier and are not acked yet,
+        # repeating them along with new messages repairs most losses before the timeout without extra network messages
+        overdue = []
+        for order in itertools.islice(self._message_store, BATCH_MAX_MESSAGES):
+            if order >= self._next_send or len(overdue) == BUNDLE_MAX_MESSAGES:
+                break
+            if self._rtt.overdue(order, time):
+                overdue.append(order)
+        return overdue
 
 
 class AtLeastOnceReceiver(Process):
@@ -104,10 +386,22 @@ class AtLeastOnceReceiver(Process):
     def on_message(self, msg: Message, sender: str, ctx: Context):
         # process messages from receiver
         # deliver message to local user with ctx.send_local()
-        order = msg["order"]
-        msg.remove("order")
-        ctx.send_local(msg)
-        ack = Message("MESSAGE", {"order": order})
+        if msg.type == "BUNDLE":
+            for _, text in msg["resent"]:
+                ctx.send_local(Message("MESSAGE", {"text": text}))
+            for text in msg["texts"]:
+                ctx.send_local(Message("MESSAGE", {"text": text}))
+            resent = [order for order, _ in msg["resent"]]
+            ack = Message("BUNDLE", {"order": msg["order"], "count": len(msg["texts"]), "resent": resent})
+        elif msg.type == "FRAME":
+            for text in msg["texts"]:
+                ctx.send_local(Message("MESSAGE", {"text": text}))
+            ack = Message("FRAME", {"order": msg["order"], "count": len(msg["texts"])})
+        else:
+            order = msg["order"]
+            msg.remove("order")
+            ctx.send_local(msg)
+            ack = Message("MESSAGE", {"order": order})
         ctx.send(ack, sender)
 
     def on_timer(self, timer_name: str, ctx: Context):
@@ -117,52 +411,209 @@ class AtLeastOnceReceiver(Process):
 
 # EXACTLY ONCE ---------------------------------------------------------------------------------------------------------
 
+# initial retransmission timeout
 DELAY_EO = 4
 MESSAGE_ORDER_LIMIT_EO = 21
 
+# the congestion window starts at MESSAGE_ORDER_LIMIT_* and is halved on retransmission timeouts when no acks came
+# for a whole timeout, it grows back with slow start, losses of single messages are repaired without shrinking it
+WINDOW_MIN = 1
+# a window is sent in up to this many frames, so that the loss of one frame is seen from the acks of the others
+WINDOW_FRAMES = 4
+# when a sender holds this many unacknowledged messages it asks the local user to pause with a BACKPRESSURE
+# local message, RESUME is sent once half of them are acknowledged
+SEND_BUFFER_LIMIT = 1000
+
+
+class _SendWindow:
+    # congestion window with its slow start threshold and recovery point, the receiver credit: orders from
+    # credit_limit on do not fit into the receiver buffer, and whether the local user is asked to pause
+    __slots__ = ("size", "threshold", "recovery", "credit_limit", "paused")
+
+    def __init__(self, limit: int, credit_limit: int):
+        self.size = limit
+        self.threshold = limit
+        self.recovery = 0
+        self.credit_limit = credit_limit
+        self.paused = False
+
+    def on_ack(self, acked: int, limit: int):
+        # additive increase: slow start below the threshold, one message per window above it
+        for _ in range(acked):
+            if self.size < self.threshold:
+                self.size += 1
+            else:
+                self.size += 1 / self.size
+        self.size = min(self.size, limit)
+
+    def on_loss(self, lower_bound: int, next_send: int):
+        # multiplicative decrease once per loss epoch: until every message sent before the previous decrease
+        # is acknowledged, further losses come from the same epoch (the recovery point of TCP)
+        if lower_bound < self.recovery:
+            return
+        self.threshold = max(self.size / 2, WINDOW_MIN)
+        self.size = self.threshold
+        self.recovery = next_send
+
+
+class _WindowSender(Process):
+    # sends messages within a sliding window, retransmits holes seen from acks and messages whose timers expire,
+    # acks carry the receiver lower bound, a bitmap of received orders above it (bit i is lower_bound + 1 + i)
+    # and the receiver credit: the number of orders from lower_bound on that fit into the receiver buffer
+    _window_limit = MESSAGE_ORDER_LIMIT_EO
+    _delay = DELAY_EO
 
-class ExactlyOnceSender(Process):
     def __init__(self, proc_id: str, receiver_id: str):
         self._id = proc_id
         self._receiver = receiver_id
         self._order = 0
         self._order_lower_bound = 0
+        self._next_send = 0
+        # the receiver buffer holds the same number of messages as the largest window
+        self._window = _SendWindow(self._window_limit, self._window_limit)
         self._message_store = dict()
+        self._rtt = _RttEstimator(self._delay)
+        self._outbox = None
+        if OUTBOX_DIR is not None:
+            self._outbox = _open_outbox(proc_id)
+            self._message_store = self._outbox.messages()
+            self._order = self._outbox.next_order
+            self._order_lower_bound = min(self._message_store, default=self._order)
+            self._next_send = self._order_lower_bound
+            self._window.credit_limit = self._order_lower_bound + self._window_limit
+
+    def on_start(self, ctx: Context):
+        # messages recovered from the outbox are resent at once, the window sets the retransmission timer
+        if self._message_store:
+            self._send_window(ctx)
 
     def on_local_message(self, msg: Message, ctx: Context):
         # receive message for delivery from local user
+        if msg.type == "STATS":
+            ctx.send_local(Message("STATS", self._rtt.stats()))
+            return
         self._message_store[self._order] = msg["text"]
-        if self._order <= self._order_lower_bound + MESSAGE_ORDER_LIMIT_EO:
-            msg["order"] = self._order
-            ctx.send(msg, self._receiver)
-        ctx.set_timer(str(self._order), DELAY_EO)
+        if self._outbox is not None:
+            self._outbox.put(self._order, msg["text"])
         self._order += 1
+        if not self._window.paused and len(self._message_store) >= SEND_BUFFER_LIMIT:
+            self._window.paused = True
+            ctx.send_local(Message("BACKPRESSURE", {"pending": len(self._message_store)}))
+        if BATCH_LINGER > 0 and not _batch_full(self._message_store, self._next_send, self._order):
+            ctx.set_timer_once("linger", BATCH_LINGER)
+            return
+        self._send_window(ctx)
 
     def on_message(self, msg: Message, sender: str, ctx: Context):
         # process messages from receiver here
-        self._message_store.pop(msg["order"], None)
-        self._order_lower_bound = max(self._order_lower_bound, msg["lower_bound"])
+        lower_bound = msg["lower_bound"]
+        time = ctx.time()
+        acked = 0
+        while self._order_lower_bound < lower_bound:
+            acked += self._on_acked(self._order_lower_bound, time, ctx)
+            self._order_lower_bound += 1
+        sack = msg["sack"]
+        # orders below the highest acknowledged one that are not acknowledged are holes
+        holes_end = lower_bound + sack.bit_length()
+        order = lower_bound + 1
+        while sack:
+            if sack & 1:
+                acked += self._on_acked(order, time, ctx)
+            sack >>= 1
+            order += 1
+        while self._order_lower_bound < self._next_send and self._order_lower_bound not in self._message_store:
+            self._order_lower_bound += 1
+        # orders recovered from the outbox may be acknowledged before they are sent again
+        self._next_send = max(self._next_send, self._order_lower_bound)
+        # older acks may come later, every advertised limit stays within the receiver buffer
+        self._window.credit_limit = max(self._window.credit_limit, lower_bound + msg["credit"])
+        if self._window.paused and len(self._message_store) <= SEND_BUFFER_LIMIT // 2:
+            self._window.paused = False
+            ctx.send_local(Message("RESUME", {"pending": len(self._message_store)}))
+        if acked:
+            self._window.on_ack(acked, self._window_limit)
+        self._resend_holes(holes_end, ctx)
+        self._send_window(ctx)
 
     def on_timer(self, timer_name: str, ctx: Context):
         # process fired timers here
+        if timer_name == "linger":
+            self._send_window(ctx)
+            return
         order = int(timer_name)
         if order not in self._message_store:
             return
+        # every message has its own timer, the window shrinks only if the link stalled
+        time = ctx.time()
+        if self._rtt.stalled(time):
+            self._window.on_loss(self._order_lower_bound, self._next_send)
+        self._rtt.on_timeout(time)
+        self._resend([order], ctx)
+
+    def _on_acked(self, order: int, time: float, ctx: Context) -> int:
+        # returns 1 if the message is acknowledged for the first time
+        if self._message_store.pop(order, None) is None:
+            return 0
+        self._rtt.on_ack(order, time)
+        ctx.cancel_timer(str(order))
+        if self._outbox is not None:
+            self._outbox.ack(order)
+        return 1
+
+    def _resend_holes(self, end: int, ctx: Context):
+        # holes are resent once they are not acknowledged for a smoothed RTT after the last transmission,
+        # so a lost message is repaired as soon as acks of later ones show it, without resending the window
+        time = ctx.time()
+        holes = [
+            order for order in range(self._order_lower_bound, min(end, self._next_send))
+            if order in self._message_store and self._rtt.overdue(order, time)
+        ]
+        if holes:
+            self._resend(holes, ctx)
+
+    def _resend(self, orders: list, ctx: Context):
+        _send_frames(orders, self._message_store, self._receiver, ctx)
+        for order in orders:
+            self._rtt.on_retransmit(order, ctx.time())
+            ctx.set_timer(str(order), self._rtt.resend_timeout(ctx.time()))
+
+    def _send_window(self, ctx: Context):
+        # the window bounds messages in flight: sent and not acknowledged, so that a lost message at the lower bound
+        # does not stop the sender while later ones are acknowledged
+        in_flight = max(0, len(self._message_store) - (self._order - self._next_send))
+        limit = min(self._order, self._next_send + int(self._window.size) - in_flight, self._window.credit_limit)
+        if self._next_send >= limit:
+            return
+        # messages recovered from the outbox may have gaps of acknowledged orders
+        orders = [order for order in range(self._next_send, limit) if order in self._message_store]
+        if self._outbox is not None:
+            self._outbox.commit()
+        frame_size = min(BATCH_MAX_MESSAGES, max(1, int(self._window.size) // WINDOW_FRAMES))
+        _send_frames(orders, self._message_store, self._receiver, ctx, frame_size)
+        for order in orders:
+            self._rtt.on_send(order, ctx.time())
+            ctx.set_timer(str(order), self._rtt.rto)
+        self._next_send = limit
+        ctx.cancel_timer("linger")
 
-        if order <= self._order_lower_bound + MESSAGE_ORDER_LIMIT_EO:
-            msg = Message(
-                "MESSAGE", {"text": self._message_store[order], "order": order}
-            )
-            ctx.send(msg, self._receiver)
 
-        ctx.set_timer(timer_name, DELAY_EO)
+def _ack(lower_bound: int, received: int, capacity: int) -> Message:
+    # received has bit i set if order lower_bound + i is received, bit 0 is always clear,
+    # messages received out of order take the buffer of the given capacity
+    credit = capacity - bin(received).count("1")
+    return Message("ACK", {"lower_bound": lower_bound, "sack": received >> 1, "credit": credit})
+
+
+class ExactlyOnceSender(_WindowSender):
+    _window_limit = MESSAGE_ORDER_LIMIT_EO
+    _delay = DELAY_EO
 
 
 class ExactlyOnceReceiver(Process):
     def __init__(self, proc_id: str):
         self._id = proc_id
         self._order_lower_bound = 0
-        self._order_store = set()
+        self._received = 0
 
     def on_local_message(self, msg: Message, ctx: Context):
         # not used in this task
@@ -171,20 +622,17 @@ class ExactlyOnceReceiver(Process):
     def on_message(self, msg: Message, sender: str, ctx: Context):
         # process messages from receiver
         # deliver message to local user with ctx.send_local()
-        order = msg["order"]
-        if order >= self._order_lower_bound and order not in self._order_store:
-            self._order_store.add(order)
-            msg.remove("order")
-            ctx.send_local(msg)
-
-        while self._order_lower_bound in self._order_store:
-            self._order_store.discard(self._order_lower_bound)
-            self._order_lower_bound += 1
-
-        ack = Message(
-            "MESSAGE", {"order": order, "lower_bound": self._order_lower_bound}
-        )
-        ctx.send(ack, sender)
+        for order, text in _unpack(msg):
+            offset = order - self._order_lower_bound
+            if offset >= 0 and not (self._received >> offset) & 1:
+                self._received |= 1 << offset
+                ctx.send_local(Message("MESSAGE", {"text": text}))
+        # skip the run of received orders starting at the lower bound
+        delivered = (~self._received & (self._received + 1)).bit_length() - 1
+        self._received >>= delivered
+        self._order_lower_bound += delivered
+
+        ctx.send(_ack(self._order_lower_bound, self._received, MESSAGE_ORDER_LIMIT_EO), sender)
 
     def on_timer(self, timer_name: str, ctx: Context):
         # process fired timers here
@@ -193,52 +641,24 @@ class ExactlyOnceReceiver(Process):
 
 # EXACTLY ONCE + ORDERED -----------------------------------------------------------------------------------------------
 
+# initial retransmission timeout
 DELAY_EOO = 4
 MESSAGE_ORDER_LIMIT_EOO = 30
 
 
-class ExactlyOnceOrderedSender(Process):
-    def __init__(self, proc_id: str, receiver_id: str):
-        self._id = proc_id
-        self._receiver = receiver_id
-        self._order = 0
-        self._order_lower_bound = 0
-        self._message_store = dict()
-
-    def on_local_message(self, msg: Message, ctx: Context):
-        # receive message for delivery from local user
-        self._message_store[self._order] = msg["text"]
-        if self._order <= self._order_lower_bound + MESSAGE_ORDER_LIMIT_EOO:
-            msg["order"] = self._order
-            ctx.send(msg, self._receiver)
-        ctx.set_timer(str(self._order), DELAY_EOO)
-        self._order += 1
-
-    def on_message(self, msg: Message, sender: str, ctx: Context):
-        # process messages from receiver here
-        self._message_store.pop(msg["order"], None)
-        self._order_lower_bound = max(self._order_lower_bound, msg["lower_bound"])
-
-    def on_timer(self, timer_name: str, ctx: Context):
-        # process fired timers here
-        order = int(timer_name)
-        if order not in self._message_store:
-            return
-
-        if order <= self._order_lower_bound + MESSAGE_ORDER_LIMIT_EOO:
-            msg = Message(
-                "MESSAGE", {"text": self._message_store[order], "order": order}
-            )
-            ctx.send(msg, self._receiver)
-
-        ctx.set_timer(timer_name, DELAY_EOO)
+class ExactlyOnceOrderedSender(_WindowSender):
+    _window_limit = MESSAGE_ORDER_LIMIT_EOO
+    _delay = DELAY_EOO
 
 
 class ExactlyOnceOrderedReceiver(Process):
+    # out of order texts wait in a ring of MESSAGE_ORDER_LIMIT_EOO slots, order is kept in slot order % size,
+    # the sender never sends orders MESSAGE_ORDER_LIMIT_EOO or more above the receiver lower bound
     def __init__(self, proc_id: str):
         self._id = proc_id
         self._order_lower_bound = 0
-        self._message_store = dict()
+        self._received = 0
+        self._slots = [None] * MESSAGE_ORDER_LIMIT_EOO
 
     def on_local_message(self, msg: Message, ctx: Context):
         # not used in this task
@@ -247,21 +667,27 @@ class ExactlyOnceOrderedReceiver(Process):
     def on_message(self, msg: Message, sender: str, ctx: Context):
         # process messages from receiver
         # deliver message to local user with ctx.send_local()
-        order = msg["order"]
-        if order >= self._order_lower_bound and order not in self._message_store:
-            self._message_store[order] = msg["text"]
-            while self._order_lower_bound in self._message_store:
-                msg = Message(
-                    "MESSAGE", {"text": self._message_store[self._order_lower_bound]}
-                )
-                ctx.send_local(msg)
-                self._message_store.pop(self._order_lower_bound)
-                self._order_lower_bound += 1
-
-        ack = Message(
-            "MESSAGE", {"order": order, "lower_bound": self._order_lower_bound}
-        )
-        ctx.send(ack, sender)
+        slots = self._slots
+        size = len(slots)
+        for order, text in _unpack(msg):
+            offset = order - self._order_lower_bound
+            if 0 <= offset < size and not (self._received >> offset) & 1:
+                self._received |= 1 << offset
+                slots[order % size] = text
+        # deliver the run of received orders starting at the lower bound in sequence
+        delivered = (~self._received & (self._received + 1)).bit_length() - 1
+        if delivered:
+            start = self._order_lower_bound % size
+            head = min(delivered, size - start)
+            texts = slots[start:start + head] + slots[:delivered - head]
+            slots[start:start + head] = [None] * head
+            slots[:delivered - head] = [None] * (delivered - head)
+            for text in texts:
+                ctx.send_local(Message("MESSAGE", {"text": text}))
+            self._received >>= delivered
+            self._order_lower_bound += delivered
+
+        ctx.send(_ack(self._order_lower_bound, self._received, len(slots)), sender)
 
     def on_timer(self, timer_name: str, ctx: Context):
         # process fired timers here
@@ -1,6 +1,81 @@
-from collections import defaultdict
+import math
+import random
+from collections import defaultdict, deque
 from dslabmp import Context, Message, Process
-from typing import List
+from typing import List, Optional, Tuple
+
+# dissemination of broadcast messages:
+# "relay" - a process relays a message to all processes when it receives the message for the first time,
+# "gossip" - a message is pushed to GOSSIP_FANOUT random processes, lost pushes are repaired
+# by push-pull anti-entropy with digests of stored messages
+DISSEMINATION = "relay"
+DISSEMINATIONS = ("relay", "gossip")
+# processes a message is pushed to by every process, None for log2 of the number of processes
+GOSSIP_FANOUT = None
+# anti-entropy rounds are done every GOSSIP_INTERVAL while there were news during the last GOSSIP_ROUNDS rounds,
+# None for log2 of the number of processes plus 2
+GOSSIP_INTERVAL = 5
+GOSSIP_ROUNDS = None
+
+# encoding of the sender state on broadcast messages:
+# "full" - the whole state vector (BCAST),
+# "sparse" - [process, counter, ...] pairs of nonzero entries (BCAST_DEPS),
+# "delta" - pairs of entries changed since the previous broadcast of the sender (BCAST_DEPS)
+VECTOR_ENCODING = "full"
+VECTOR_ENCODINGS = ("full", "sparse", "delta")
+
+# up to BATCH_MAX_MESSAGES texts of a broadcaster are sent in one message covering consecutive counters,
+# a broadcaster waits up to BATCH_LINGER for more texts before sending a batch that is not full (1 disables batching)
+BATCH_MAX_MESSAGES = 1
+BATCH_LINGER = 1
+# a batch carries "texts" for counters starting from "counter" instead of "text"
+BROADCAST_TYPES = ("BCAST", "BCAST_DEPS", "BCAST_BATCH", "BCAST_DEPS_BATCH")
+
+
+def _texts(msg: Message) -> List[str]:
+    if msg.type.endswith("_BATCH"):
+        return msg["texts"]
+    return [msg["text"]]
+
+
+class _Gossip:
+    """
+    State of gossip dissemination: stored messages for anti-entropy with the processes known to store them,
+    prefixes of stored, stable (stored by a majority of processes) and pruned (stored by all processes)
+    messages by sender, and stored messages not known to be stable yet.
+    """
+
+    def __init__(self, proc_id: str, processes: List[str]):
+        rounds = math.ceil(math.log2(len(processes))) if len(processes) > 1 else 0
+        self.processes = list(processes)
+        self.peers = [proc for proc in processes if proc != proc_id]
+        self.fanout = GOSSIP_FANOUT if GOSSIP_FANOUT is not None else max(1, rounds)
+        self.rounds = GOSSIP_ROUNDS if GOSSIP_ROUNDS is not None else rounds + 2
+        self.rounds_left = 0
+        self.random = random.Random(proc_id)
+        self.store = dict()
+        self.holders = defaultdict(set)
+        self.unstable = set()
+        self.received = [0 for _ in processes]
+        self.stable = [0 for _ in processes]
+        self.pruned = [0 for _ in processes]
+
+    def sample(self, count: int) -> List[str]:
+        return self.random.sample(self.peers, min(count, len(self.peers)))
+
+    def prune(self, message_hash: Tuple[int, int], everywhere: bool = False):
+        """
+        Forgets a stable message once every process is known to store it, it is never pushed again.
+        """
+        process, counter = message_hash
+        if message_hash not in self.store or message_hash in self.unstable or counter >= self.received[process]:
+            return
+        if not everywhere and len(self.holders[message_hash]) < len(self.processes):
+            return
+        del self.store[message_hash]
+        del self.holders[message_hash]
+        while self.pruned[process] < self.received[process] and (process, self.pruned[process]) not in self.store:
+            self.pruned[process] += 1
 
 
 class BroadcastProcess(Process):
@@ -8,75 +83,277 @@ class BroadcastProcess(Process):
         self._processes = {processes[id]: id for id in range(len(processes))}
         self._id = self._processes[proc_id]
         self._counter = 0
+        # texts waiting to be broadcast in a batch
+        self._pending = []
 
+        if VECTOR_ENCODING not in VECTOR_ENCODINGS:
+            raise ValueError('unknown vector encoding {}'.format(VECTOR_ENCODING))
         self._state = [0 for _ in range(len(processes))]
-        self._messages_deliver = set()
+        # state sent with the previous broadcast, the base of delta encoding, None with other encodings
+        self._broadcast_state = [0 for _ in range(len(processes))] if VECTOR_ENCODING == "delta" else None
         self._messages_buffer = defaultdict()
+        # buffered messages by the (sender, counter) of the message they wait for,
+        # with the state index to continue checking their dependencies from
+        self._messages_waiting = defaultdict(list)
         self._messages_broadcasters = defaultdict(set)
 
+        if DISSEMINATION not in DISSEMINATIONS:
+            raise ValueError('unknown dissemination {}'.format(DISSEMINATION))
+        self._gossip = _Gossip(proc_id, processes) if DISSEMINATION == "gossip" else None
+
     def on_local_message(self, msg: Message, ctx: Context):
         if msg.type == "SEND":
-            bcast_msg = Message(
-                "BCAST",
-                {
-                    "text": msg["text"],
-                    "sender": self._id,
-                    "counter": self._counter,
-                    "state": self._state,
-                },
-            )
+            self._pending.append(msg["text"])
+            if len(self._pending) < BATCH_MAX_MESSAGES:
+                ctx.set_timer_once("batch", BATCH_LINGER)
+                return
+            if len(self._pending) > 1:
+                ctx.cancel_timer("batch")
+            self.broadcast_pending(ctx)
+
+    def broadcast_pending(self, ctx: Context):
+        """
+        Broadcasts pending texts as one message. The batch depends on the state at the moment it is sent,
+        which includes the state at the moment each of its texts was sent by the user.
+        """
+        texts = self._pending
+        self._pending = []
+        data = {"sender": self._id, "counter": self._counter}
+        if len(texts) == 1:
+            data["text"] = texts[0]
+            suffix = ""
+        else:
+            data["texts"] = texts
+            suffix = "_BATCH"
+        if VECTOR_ENCODING == "full":
+            # a copy, the message may be delivered by reference and the state changes later
+            data["state"] = list(self._state)
+            bcast_msg = Message("BCAST" + suffix, data)
+        else:
+            data["deps"] = self.encode_dependencies()
+            bcast_msg = Message("BCAST_DEPS" + suffix, data)
+        if self._gossip is None:
             self.best_effort_broadcast(bcast_msg, ctx)
-            self._counter += 1
+        else:
+            self.on_gossip_message(bcast_msg, self._gossip.processes[self._id], ctx)
+        self._counter += len(texts)
+
+    def encode_dependencies(self) -> List[int]:
+        """
+        Returns flattened (process, counter) pairs of the current state for a BCAST_DEPS message.
+
+        A receiver delivers a message only after the previous message of its sender, so the entries
+        that did not change since the previous broadcast are already delivered by the receiver
+        and can be omitted in delta encoding, as well as zero entries in sparse encoding.
+        """
+        base = self._broadcast_state
+        deps = []
+        for i, counter in enumerate(self._state):
+            if counter > (0 if base is None else base[i]):
+                deps += (i, counter)
+        if base is not None:
+            self._broadcast_state = list(self._state)
+        return deps
 
     def best_effort_broadcast(self, msg: Message, ctx: Context):
-        for proc in self._processes.keys():
-            ctx.send(msg, proc)
+        ctx.send_many(msg, self._processes.keys())
 
     def on_message(self, msg: Message, sender: str, ctx: Context):
-        if msg.type == "BCAST":
+        if msg.type == "DIGEST":
+            self.on_digest(msg, sender, ctx)
+        elif self._gossip is not None:
+            self.on_gossip_message(msg, sender, ctx)
+        elif msg.type in BROADCAST_TYPES:
             message_hash = (msg["sender"], msg["counter"])
+            if self.is_delivered(message_hash):
+                # the message was relayed before its delivery, later copies need no bookkeeping
+                return
             self._messages_broadcasters[message_hash].add(self._processes[sender])
             if self._id not in self._messages_broadcasters[message_hash]:
                 self.best_effort_broadcast(msg, ctx)
                 self._messages_broadcasters[message_hash].add(self._id)
 
-            if message_hash not in self._messages_deliver and len(
-                self._messages_broadcasters[message_hash]
-            ) * 2 >= len(self._processes):
-                if self.is_casually_ordered(msg):
-                    self.deliver_message(msg, ctx)
-                    self.update_deliver(ctx)
-                else:
-                    self._messages_buffer[message_hash] = msg
+            if (
+                message_hash not in self._messages_buffer
+                and len(self._messages_broadcasters[message_hash]) * 2 >= len(self._processes)
+            ):
+                self._messages_buffer[message_hash] = msg
+                self.update_deliver(deque([(message_hash, 0)]), ctx)
+
+    def is_delivered(self, message_hash: Tuple[int, int]) -> bool:
+        # messages of a process are delivered in the order of counters, so the state is a delivered watermark
+        process, counter = message_hash
+        return counter < self._state[process]
 
     def is_casually_ordered(self, msg: Message):
+        return self.missing_dependency(msg) is None
+
+    def missing_dependency(self, msg: Message, start: int = 0) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns (process, counter, index) of the first message msg depends on that is not delivered yet,
+        or None if msg can be delivered. Entries of the encoded state before start are known to be delivered,
+        checking of further dependencies continues from index.
+        """
         sender = msg["sender"]
         counter = msg["counter"]
-        state = msg["state"]
-        return counter == self._state[sender] and all(
-            state[i] <= self._state[i] for i in range(len(self._state))
-        )
+        if counter > self._state[sender]:
+            return sender, counter - 1, start
+        if not msg.type.startswith("BCAST_DEPS"):
+            state = msg["state"]
+            for i in range(start, len(self._state)):
+                if state[i] > self._state[i]:
+                    return i, state[i] - 1, i
+            return None
+        deps = msg["deps"]
+        for index in range(start, len(deps), 2):
+            process, counter = deps[index], deps[index + 1]
+            if counter > self._state[process]:
+                return process, counter - 1, index
+        return None
 
     def deliver_message(self, msg: Message, ctx: Context):
         message_hash = (msg["sender"], msg["counter"])
-        self._state[msg["sender"]] = msg["counter"] + 1
-        self._messages_deliver.add(message_hash)
-        self._messages_broadcasters.pop(message_hash)
-        deliver_msg = Message("DELIVER", {"text": msg["text"]})
-        ctx.send_local(deliver_msg)
-
-    def update_deliver(self, ctx):
-        is_update = True
-        while is_update:
-            is_update = False
-            delivered = []
-            for message_hash, msg in self._messages_buffer.items():
-                if self.is_casually_ordered(msg):
-                    delivered.append(message_hash)
-                    self.deliver_message(msg, ctx)
-                    is_update = True
-            for message_hash in delivered:
-                self._messages_buffer.pop(message_hash)
+        texts = _texts(msg)
+        self._state[msg["sender"]] = msg["counter"] + len(texts)
+        self._messages_broadcasters.pop(message_hash, None)
+        for text in texts:
+            deliver_msg = Message("DELIVER", {"text": text})
+            ctx.send_local(deliver_msg)
+
+    def update_deliver(self, ready: deque, ctx: Context):
+        # every delivery wakes only the buffered messages waiting for it
+        while ready:
+            message_hash, start = ready.popleft()
+            msg = self._messages_buffer[message_hash]
+            dependency = self.missing_dependency(msg, start)
+            if dependency is not None:
+                process, counter, index = dependency
+                self._messages_waiting[(process, counter)].append((message_hash, index))
+                continue
+            self._messages_buffer.pop(message_hash)
+            self.deliver_message(msg, ctx)
+            # messages may wait for any counter covered by a batch
+            process, first = message_hash
+            for counter in range(first, self._state[process]):
+                ready.extend(self._messages_waiting.pop((process, counter), ()))
+
+    def on_gossip_message(self, msg: Message, sender: str, ctx: Context):
+        """
+        Stores a message received for the first time and pushes it to random processes.
+
+        The sender of a message stores it, so it is counted towards the majority the same way as a relaying
+        process. The broadcaster is told about every new copy and usually learns the majority first.
+        """
+        gossip = self._gossip
+        process = msg["sender"]
+        message_hash = (process, msg["counter"])
+        if message_hash in gossip.store:
+            gossip.holders[message_hash].add(self._processes[sender])
+            if message_hash in gossip.unstable:
+                self.update_stable(ctx)
+            else:
+                gossip.prune(message_hash)
+            return
+        if msg["counter"] < gossip.received[process]:
+            # pruned
+            return
+        gossip.store[message_hash] = msg
+        next_msg = gossip.store.get((process, gossip.received[process]))
+        while next_msg is not None:
+            gossip.received[process] += len(_texts(next_msg))
+            next_msg = gossip.store.get((process, gossip.received[process]))
+        gossip.unstable.add(message_hash)
+        gossip.holders[message_hash].update((self._id, self._processes[sender]))
+        ctx.send_many(msg, gossip.sample(gossip.fanout))
+        if process != self._id:
+            self.send_digest(gossip.processes[process], "info", ctx)
+        self.gossip_news(ctx)
+        self.update_stable(ctx)
+
+    def send_digest(self, to: str, kind: str, ctx: Context):
+        """
+        Sends prefixes of stored, stable and pruned messages. A "sync" digest starts an anti-entropy round and is
+        answered with a "reply" digest, both sides push the messages the other side has not stored.
+        An "info" digest only tells about stored, stable and pruned messages.
+        """
+        gossip = self._gossip
+        data = {
+            "kind": kind,
+            "received": list(gossip.received),
+            "stable": list(gossip.stable),
+            "pruned": list(gossip.pruned),
+        }
+        ctx.send(Message("DIGEST", data), to)
+
+    def on_digest(self, msg: Message, sender: str, ctx: Context):
+        gossip = self._gossip
+        received = msg["received"]
+        if msg["kind"] != "info":
+            for process, counter in enumerate(received):
+                for missing in range(counter, gossip.received[process]):
+                    missing_msg = gossip.store.get((process, missing))
+                    if missing_msg is not None:
+                        ctx.send(missing_msg, sender)
+        peer = self._processes[sender]
+        stored = [message_hash for message_hash in gossip.holders if message_hash[1] < received[message_hash[0]]]
+        for message_hash in stored:
+            gossip.holders[message_hash].add(peer)
+        advanced = False
+        for process, counter in enumerate(msg["stable"]):
+            if counter > gossip.stable[process]:
+                gossip.stable[process] = counter
+                advanced = True
+        self.update_stable(ctx, advanced)
+        # messages pruned by the peer are stable and stored by every process
+        for process, counter in enumerate(msg["pruned"]):
+            for pruned in range(gossip.pruned[process], min(counter, gossip.received[process])):
+                gossip.prune((process, pruned), everywhere=True)
+        for message_hash in stored:
+            gossip.prune(message_hash)
+        if msg["kind"] == "sync":
+            self.send_digest(sender, "reply", ctx)
+
+    def update_stable(self, ctx: Context, advanced: bool = False):
+        """
+        Delivers stored messages that are known to be stored by a majority of processes, in causal order.
+        If stable prefixes advanced, they are pushed to random processes like a new message.
+        """
+        gossip = self._gossip
+        ready = deque()
+        for message_hash in sorted(gossip.unstable):
+            process, counter = message_hash
+            if (
+                counter >= gossip.stable[process]
+                and len(gossip.holders[message_hash]) * 2 < len(self._processes)
+            ):
+                continue
+            gossip.unstable.remove(message_hash)
+            self._messages_buffer[message_hash] = gossip.store[message_hash]
+            ready.append((message_hash, 0))
+            gossip.prune(message_hash)
+            next_hash = (process, gossip.stable[process])
+            while next_hash[1] < gossip.received[process] and next_hash not in gossip.unstable:
+                gossip.stable[process] += 1
+                next_hash = (process, gossip.stable[process])
+                advanced = True
+        self.update_deliver(ready, ctx)
+        if advanced:
+            self.gossip_news(ctx)
+            for peer in gossip.sample(gossip.fanout):
+                self.send_digest(peer, "info", ctx)
+
+    def gossip_news(self, ctx: Context):
+        self._gossip.rounds_left = self._gossip.rounds
+        ctx.set_timer_once("gossip", GOSSIP_INTERVAL)
 
     def on_timer(self, timer_name: str, ctx: Context):
-        pass
+        if timer_name == "batch":
+            self.broadcast_pending(ctx)
+            return
+        gossip = self._gossip
+        if timer_name == "gossip" and gossip.rounds_left > 0:
+            gossip.rounds_left -= 1
+            for peer in gossip.sample(1):
+                self.send_digest(peer, "sync", ctx)
+            if gossip.rounds_left > 0:
+                ctx.set_timer("gossip", GOSSIP_INTERVAL)
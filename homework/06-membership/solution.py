@@ -215,19 +215,21 @@ class GroupMember(Process):
                 ctx.send(ping_message, suspect_random)
 
         elif timer_type == "pingfailed":
+            ping_targets = []
             for _ in range(min(FANOUT, len(self._active))):
                 active_random = self._choose_random_active()
                 if active_random != self._id:
-                    ping_message = Message(
-                        "PING",
-                        {
-                            "sender": self._id,
-                            "reciever": id,
-                            "active": self._active,
-                            "suspect": self._suspect,
-                        },
-                    )
-                    ctx.send(ping_message, active_random)
+                    ping_targets.append(active_random)
+            ping_message = Message(
+                "PING",
+                {
+                    "sender": self._id,
+                    "reciever": id,
+                    "active": self._active,
+                    "suspect": self._suspect,
+                },
+            )
+            ctx.send_many(ping_message, ping_targets)
             ctx.set_timer_once(f"pingthroufailed_{id}", ROUND_TRIP * 2)
 
         elif timer_type == "pingthroufailed":
@@ -0,0 +1,98 @@
+"""
+Stress test of AtMostOnceReceiver duplicate suppression.
+
+Feeds the receiver a long stream of orders where every order is delayed by a random
+displacement of up to --reorder positions and duplicated with probability --dup,
+checks that no message is delivered twice and reports throughput, delivered share
+and the largest size of the encoded receiver state.
+
+Usage: python benchmarks/amo_stress.py [--orders 2000000] [--reorder 32] [--dup 0.2] [--impl solution.py]
+"""
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Context, Message, decode_message  # noqa: E402
+from dslabnode import load_process_class  # noqa: E402
+
+IMPL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "01-guarantees", "solution.py")
+
+
+def arrivals(orders: int, reorder: int, dup: float, seed: int):
+    # streams orders in arrival order keeping only the reordering window in memory
+    rand = random.Random(seed)
+    heap = []
+    for order in range(orders):
+        heapq.heappush(heap, (order + rand.uniform(0, reorder), order))
+        if rand.random() < dup:
+            heapq.heappush(heap, (order + rand.uniform(0, reorder), order))
+        while heap[0][0] <= order:
+            yield heapq.heappop(heap)[1]
+    while heap:
+        yield heapq.heappop(heap)[1]
+
+
+def run(impl: str, orders: int, reorder: int, dup: float, seed: int, sample_every: int = 1000) -> dict:
+    receiver = load_process_class(impl, "AtMostOnceReceiver")("receiver")
+    delivered = bytearray(orders)
+    delivered_count = 0
+    duplicates = 0
+    received = 0
+    max_state = 0
+    handler_seconds = 0.0
+    clock = time.perf_counter
+    start = clock()
+    for order in arrivals(orders, reorder, dup, seed):
+        ctx = Context(0.0)
+        msg = Message("MESSAGE", {"text": str(order), "order": order})
+        handler_start = clock()
+        receiver.on_message(msg, "sender", ctx)
+        handler_seconds += clock() - handler_start
+        for msg_type, data in ctx._sent_local_messages:
+            delivered_order = int(decode_message(msg_type, data)["text"])
+            if delivered[delivered_order]:
+                duplicates += 1
+            delivered[delivered_order] = 1
+            delivered_count += 1
+        received += 1
+        if received % sample_every == 0:
+            max_state = max(max_state, len(receiver.get_state()))
+    elapsed = clock() - start
+    return {
+        "received": received,
+        "delivered": delivered_count - duplicates,
+        "duplicates": duplicates,
+        "seconds": elapsed,
+        "handler_seconds": handler_seconds,
+        "max_state": max_state,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=2000000)
+    parser.add_argument("--reorder", type=int, default=32)
+    parser.add_argument("--dup", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--impl", default=IMPL)
+    args = parser.parse_args()
+
+    res = run(os.path.abspath(args.impl), args.orders, args.reorder, args.dup, args.seed)
+    print("orders: {}, reorder: {}, dup: {}".format(args.orders, args.reorder, args.dup))
+    print("received: {}, delivered: {} ({:.2%}), duplicates: {}".format(
+        res["received"], res["delivered"], res["delivered"] / args.orders, res["duplicates"]
+    ))
+    print("{:.2f} s, handler {:.2f} s, {:.0f} messages/s in handler, max state: {} bytes".format(
+        res["seconds"], res["handler_seconds"], res["received"] / res["handler_seconds"], res["max_state"]
+    ))
+    if res["duplicates"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Drain of a causal delivery backlog in BroadcastProcess.
+
+A process receives --messages broadcasts of another process in reverse order, as after
+the sender reconnects, so all of them are buffered until the first one arrives and then
+delivered at once. Every message also depends on the previous message of a third process,
+which arrives last. Reports the time of the final drain.
+
+Usage: python benchmarks/broadcast_backlog.py [--messages 1000 10000 100000] [--impl solution.py]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Context, Message  # noqa: E402
+from dslabnode import load_process_class  # noqa: E402
+
+IMPL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "04-broadcast", "solution.py")
+
+
+def drain(impl: str, messages: int) -> dict:
+    ids = ["0", "1", "2"]
+    proc = load_process_class(impl, "BroadcastProcess")("0", ids)
+
+    def receive(sender: int, counter: int, state: list):
+        ctx = Context(0.0)
+        text = "{}:{}".format(sender, counter)
+        msg = Message("BCAST", {"text": text, "sender": sender, "counter": counter, "state": state})
+        proc.on_message(msg, str(sender), ctx)
+        return len(ctx._sent_local_messages)
+
+    start = time.perf_counter()
+    for counter in reversed(range(1, messages)):
+        receive(1, counter, [0, counter, 1])
+    receive(1, 0, [0, 0, 1])
+    buffered = time.perf_counter()
+    delivered = receive(2, 0, [0, 0, 0])
+    drained = time.perf_counter()
+    return {"buffer": buffered - start, "drain": drained - buffered, "delivered": delivered}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--impl", default=IMPL)
+    args = parser.parse_args()
+
+    for messages in args.messages:
+        res = drain(os.path.abspath(args.impl), messages)
+        print("{:>7} messages: buffered in {:.3f} s, drained in {:.3f} s ({:.2f} us/message), delivered {}".format(
+            messages, res["buffer"], res["drain"], res["drain"] / messages * 1e6, res["delivered"]
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Batched broadcast in BroadcastProcess under bursty load.
+
+Random processes of a group of --processes send bursts of --burst messages in a row, every burst is followed
+by a pause of --pause simulation steps. Reports network messages and traffic per broadcast text for different
+BATCH_MAX_MESSAGES and checks that every process delivered every text.
+
+Usage: python benchmarks/broadcast_burst.py [--processes 10] [--bursts 20] [--burst 16] [--batch 1 4 16]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnet import NetworkModel, Uniform  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+from workloads import load_solution  # noqa: E402
+
+
+def run(batch: int, processes: int, bursts: int, burst: int, pause: int, seed: int) -> dict:
+    sol = load_solution("04-broadcast")
+    sol.BATCH_MAX_MESSAGES = batch
+    net = NetworkModel(seed=seed, latency=Uniform(1.0, 5.0))
+    sim = Simulation(seed=seed, network=net)
+    ids = [str(i) for i in range(processes)]
+    for proc_id in ids:
+        sim.add_process(proc_id, sol.BroadcastProcess(proc_id, ids))
+    rand = random.Random(seed)
+    texts = 0
+    for _ in range(bursts):
+        proc_id = rand.choice(ids)
+        for _ in range(burst):
+            sim.send_local_message(proc_id, Message("SEND", {"text": "message {}".format(texts)}))
+            texts += 1
+        sim.steps(pause)
+    sim.step_until_no_events()
+    sol.BATCH_MAX_MESSAGES = 1
+    delivered = [len(sim.read_local_messages(proc_id)) for proc_id in ids]
+    return {
+        "messages": sim.message_count / texts,
+        "traffic": sim.traffic / texts,
+        "complete": sum(count == texts for count in delivered),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=10)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst", type=int, default=16, help="messages sent in a row")
+    parser.add_argument("--pause", type=int, default=100, help="simulation steps between bursts")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seed", type=int, default=123)
+    args = parser.parse_args()
+
+    for batch in args.batch:
+        res = run(batch, args.processes, args.bursts, args.burst, args.pause, args.seed)
+        print("batch {:>3}: {:>7.1f} messages/text, {:>8.0f} bytes/text, {}/{} processes delivered all".format(
+            batch, res["messages"], res["traffic"], res["complete"], args.processes
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Message complexity of relay and gossip dissemination in BroadcastProcess.
+
+Random processes of a group of --processes broadcast --messages messages with pauses of --pause
+simulation steps between them. Reports network messages and traffic per broadcast, the largest number
+of messages a process still keeps metadata for at the end, and checks that every process delivered every
+message. With --drop the network loses messages, which gossip repairs by anti-entropy while relaying to all
+processes assumes a reliable network.
+
+Usage: python benchmarks/broadcast_gossip.py [--processes 10 50 100 200] [--messages 20] [--drop 0.0]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnet import NetworkModel, Uniform  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+from workloads import load_solution  # noqa: E402
+
+MODES = ("relay", "gossip")
+
+
+def run(mode: str, processes: int, messages: int, pause: int, drop: float, seed: int) -> dict:
+    sol = load_solution("04-broadcast")
+    sol.DISSEMINATION = mode
+    net = NetworkModel(seed=seed, latency=Uniform(1.0, 5.0), drop_rate=drop)
+    sim = Simulation(seed=seed, network=net)
+    ids = [str(i) for i in range(processes)]
+    procs = [sol.BroadcastProcess(proc_id, ids) for proc_id in ids]
+    for proc_id, proc in zip(ids, procs):
+        sim.add_process(proc_id, proc)
+    rand = random.Random(seed)
+    for i in range(messages):
+        sim.send_local_message(rand.choice(ids), Message("SEND", {"text": "message {}".format(i)}))
+        sim.steps(pause)
+    sim.step_until_no_events()
+    sol.DISSEMINATION = "relay"
+    delivered = [len(sim.read_local_messages(proc_id)) for proc_id in ids]
+    return {
+        "messages": sim.message_count / messages,
+        "traffic": sim.traffic / messages,
+        "complete": sum(count == messages for count in delivered),
+        "retained": max(_retained(proc) for proc in procs),
+    }
+
+
+def _retained(proc) -> int:
+    retained = len(proc._messages_broadcasters) + len(proc._messages_buffer)
+    if proc._gossip is not None:
+        retained += len(proc._gossip.store)
+    return retained
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--pause", type=int, default=10, help="simulation steps between broadcasts")
+    parser.add_argument("--drop", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    args = parser.parse_args()
+
+    for processes in args.processes:
+        for mode in args.modes:
+            res = run(mode, processes, args.messages, args.pause, args.drop, args.seed)
+            print("{:>4} processes, {:>6}: {:>9.0f} messages/broadcast ({:.1f} x N), {:>11.0f} bytes/broadcast, "
+                  "{}/{} processes delivered all, {} retained".format(
+                      processes, mode, res["messages"], res["messages"] / processes, res["traffic"],
+                      res["complete"], processes, res["retained"]
+                  ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Size of the sender state carried by broadcast messages with different vector encodings.
+
+A group of --processes processes where only --active of them broadcast, each round a random
+active process broadcasts a message which is delivered to all active processes. Reports the average
+JSON payload of a broadcast message and the traffic of one broadcast (every process relays it to all
+processes), and checks that every active process delivered every message in the same causal order.
+
+Usage: python benchmarks/broadcast_vectors.py [--processes 10 100 1000] [--active 10] [--rounds 200]
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Context, Message, decode_message  # noqa: E402
+from workloads import load_solution  # noqa: E402
+
+ENCODINGS = ("full", "sparse", "delta")
+
+
+def run(encoding: str, processes: int, active: int, rounds: int, seed: int) -> dict:
+    sol = load_solution("04-broadcast")
+    sol.VECTOR_ENCODING = encoding
+    ids = [str(i) for i in range(processes)]
+    procs = [sol.BroadcastProcess(ids[i], ids) for i in range(min(active, processes))]
+    # a message is delivered once received from a majority of processes
+    relays = ids[:processes // 2 + 1]
+    delivered = [[] for _ in procs]
+    payload_bytes = 0
+    rand = random.Random(seed)
+    for i in range(rounds):
+        ctx = Context(0.0)
+        procs[rand.randrange(len(procs))].on_local_message(Message("SEND", {"text": str(i)}), ctx)
+        msg_type, payload, _ = ctx._sent_messages[0]
+        payload_bytes += len(payload)
+        for proc, texts in zip(procs, delivered):
+            for relay in relays:
+                ctx = Context(0.0, transport="ref")
+                proc.on_message(decode_message(msg_type, payload), relay, ctx)
+                texts += [decode_message(t, data)["text"] for t, data in ctx._sent_local_messages]
+    sol.VECTOR_ENCODING = "full"
+    return {
+        "payload": payload_bytes / rounds,
+        "ok": all(len(texts) == rounds for texts in delivered) and _causal(delivered),
+    }
+
+
+def _causal(delivered: list) -> bool:
+    # with every message delivered everywhere the rounds give a causal order, so all logs are the same
+    return all(texts == delivered[0] for texts in delivered)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--active", type=int, default=10, help="processes that broadcast")
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=ENCODINGS)
+    args = parser.parse_args()
+
+    failed = False
+    for processes in args.processes:
+        for encoding in args.encodings:
+            res = run(encoding, processes, args.active, args.rounds, args.seed)
+            failed |= not res["ok"]
+            print("{:>5} processes, {:>6}: {:>8.1f} bytes/message, {:>10.1f} KB/broadcast{}".format(
+                processes, encoding, res["payload"], res["payload"] * processes * processes / 1024,
+                "" if res["ok"] else " MISMATCH"
+            ))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
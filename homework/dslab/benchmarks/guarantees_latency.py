@@ -0,0 +1,89 @@
+"""
+Delivery latency of guarantee senders on a lossy network.
+
+The sender of each guarantee gets --messages messages, one every --interval units of simulation time, the network
+drops messages with every rate of --drop and duplicates them with --dup. Reports the time from the first send
+to the first delivery of the last message, the median and 99th percentile of per-message latency (from the
+local message to its first delivery, measured to within --interval) and the number of network messages,
+which suite.py reports alone. Pass an older solution with --impl to compare.
+
+Usage: python benchmarks/guarantees_latency.py [--messages 1000] [--interval 0.25] [--drop 0 0.1 0.3] [--dup 0.05]
+       [--impl solution.py]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnet import NetworkModel, Uniform  # noqa: E402
+from dslabnode import load_process_class  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+
+IMPL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "01-guarantees", "solution.py")
+
+GUARANTEES = {
+    "ALO": ("AtLeastOnceSender", "AtLeastOnceReceiver"),
+    "EO": ("ExactlyOnceSender", "ExactlyOnceReceiver"),
+    "EOO": ("ExactlyOnceOrderedSender", "ExactlyOnceOrderedReceiver"),
+}
+
+
+def run(impl: str, guarantee: str, messages: int, interval: float, drop: float, dup: float, seed: int) -> dict:
+    sender_cls, receiver_cls = GUARANTEES[guarantee]
+    net = NetworkModel(seed=seed, latency=Uniform(0.5, 3.0), drop_rate=drop, dup_rate=dup)
+    sim = Simulation(seed=seed, network=net)
+    sim.add_process("sender", load_process_class(impl, sender_cls)("sender", "receiver"))
+    sim.add_process("receiver", load_process_class(impl, receiver_cls)("receiver"))
+    sent = dict()
+    delivered = dict()
+    for i in range(messages):
+        text = "message {}".format(i)
+        sent[text] = sim.time()
+        sim.send_local_message("sender", Message("MESSAGE", {"text": text}))
+        sim.step_until_time(sim.time() + interval)
+        for msg in sim.read_local_messages("receiver"):
+            delivered.setdefault(msg["text"], sim.time())
+    while sim.step():
+        for msg in sim.read_local_messages("receiver"):
+            delivered.setdefault(msg["text"], sim.time())
+    latencies = sorted(delivered[text] - sent[text] for text in delivered)
+    return {
+        "delivered": len(delivered),
+        "completion": max(delivered.values(), default=0.0) - min(sent.values()),
+        "median": _percentile(latencies, 0.5),
+        "p99": _percentile(latencies, 0.99),
+        "messages": sim.message_count,
+    }
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=0.25, help="simulation time between local messages")
+    parser.add_argument("--drop", type=float, nargs="+", default=[0.0, 0.1, 0.3])
+    parser.add_argument("--dup", type=float, default=0.05)
+    parser.add_argument("--guarantees", nargs="+", default=list(GUARANTEES), choices=list(GUARANTEES))
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--impl", default=IMPL)
+    args = parser.parse_args()
+
+    for guarantee in args.guarantees:
+        for drop in args.drop:
+            res = run(os.path.abspath(args.impl), guarantee, args.messages, args.interval, drop, args.dup, args.seed)
+            print("{:>3} drop {:.2f}: completion {:>8.1f}, latency median {:>6.1f} p99 {:>7.1f}, "
+                  "{:>6} messages, {}/{} delivered".format(
+                      guarantee, drop, res["completion"], res["median"], res["p99"], res["messages"],
+                      res["delivered"], args.messages
+                  ))
+
+
+if __name__ == "__main__":
+    main()
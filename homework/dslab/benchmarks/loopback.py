@@ -0,0 +1,138 @@
+"""
+Ping-pong benchmark of the asyncio runtime over loopback.
+
+The pinger keeps --window pings in flight and sends the next one on every pong,
+round-trip times are measured with Context.time() of the pinger.
+With --workers 2 the ponger runs in a separate OS process.
+
+Usage: python benchmarks/loopback.py [--protocol udp|tcp] [--count 20000] [--window 16] [--workers 1]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Context, Message, Process  # noqa: E402
+from dslabnode import Node  # noqa: E402
+
+
+class Pinger(Process):
+    def __init__(self, proc_id: str, peer: str):
+        self._id = proc_id
+        self._peer = peer
+        self._count = 0
+        self._sent = 0
+        self.rtts = []
+
+    def on_local_message(self, msg: Message, ctx: Context):
+        if msg.type == "START":
+            self._count = msg["count"]
+            for _ in range(min(msg["window"], self._count)):
+                self._ping(ctx)
+
+    def on_message(self, msg: Message, sender: str, ctx: Context):
+        if msg.type == "PONG":
+            self.rtts.append(ctx.time() - msg["ts"])
+            if self._sent < self._count:
+                self._ping(ctx)
+            elif len(self.rtts) == self._count:
+                ctx.send_local(Message("DONE", {}))
+
+    def on_timer(self, timer_name: str, ctx: Context):
+        pass
+
+    def _ping(self, ctx: Context):
+        self._sent += 1
+        ctx.send(Message("PING", {"seq": self._sent, "ts": ctx.time()}), self._peer)
+
+
+class Ponger(Process):
+    def __init__(self, proc_id: str):
+        self._id = proc_id
+
+    def on_local_message(self, msg: Message, ctx: Context):
+        pass
+
+    def on_message(self, msg: Message, sender: str, ctx: Context):
+        if msg.type == "PING":
+            ctx.send(Message("PONG", {"seq": msg["seq"], "ts": msg["ts"]}), sender)
+
+    def on_timer(self, timer_name: str, ctx: Context):
+        pass
+
+
+async def serve_ponger(peers, protocol: str):
+    node = Node("ponger", Ponger("ponger"), peers, protocol)
+    await node.start()
+    await asyncio.Event().wait()
+
+
+def run_ponger(peers, protocol: str):
+    try:
+        asyncio.run(serve_ponger(peers, protocol))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run(peers, protocol: str, count: int, window: int, separate: bool, timeout: float):
+    pinger = Pinger("pinger", "ponger")
+    nodes = [Node("pinger", pinger, peers, protocol)]
+    if not separate:
+        nodes.append(Node("ponger", Ponger("ponger"), peers, protocol))
+    for node in nodes:
+        await node.start()
+    # give a separate ponger process time to bind its socket
+    await asyncio.sleep(0.5 if separate else 0.05)
+
+    start = time.perf_counter()
+    nodes[0].send_local_message(Message("START", {"count": count, "window": window}))
+    try:
+        await asyncio.wait_for(nodes[0].local_messages.get(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+    for node in nodes:
+        await node.stop()
+    return pinger.rtts, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--protocol", choices=["udp", "tcp"], default="udp")
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--window", type=int, default=16)
+    parser.add_argument("--workers", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--port", type=int, default=19000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    peers = {"pinger": ("127.0.0.1", args.port), "ponger": ("127.0.0.1", args.port + 1)}
+    child = None
+    if args.workers == 2:
+        child = multiprocessing.Process(target=run_ponger, args=(peers, args.protocol), daemon=True)
+        child.start()
+    try:
+        rtts, elapsed = asyncio.run(
+            run(peers, args.protocol, args.count, args.window, child is not None, args.timeout)
+        )
+    finally:
+        if child is not None:
+            child.terminate()
+
+    rtts.sort()
+    completed = len(rtts)
+    print("protocol: {}, workers: {}, window: {}".format(args.protocol, args.workers, args.window))
+    print("completed: {}/{} round trips in {:.3f} s".format(completed, args.count, elapsed))
+    if completed:
+        print("throughput: {:.0f} msgs/s".format(2 * completed / elapsed))
+        print("rtt p50: {:.3f} ms, p99: {:.3f} ms, max: {:.3f} ms".format(
+            1000 * rtts[completed // 2], 1000 * rtts[min(completed - 1, int(completed * 0.99))], 1000 * rtts[-1]
+        ))
+
+
+if __name__ == "__main__":
+    main()
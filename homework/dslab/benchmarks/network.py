@@ -0,0 +1,51 @@
+"""
+Throughput of the network model: samples deliveries of many messages between random links.
+
+Usage: python benchmarks/network.py [--messages 1000000] [--nodes 50] [--no-numpy]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabnet import LogNormal, NetworkModel, Uniform  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--nodes", type=int, default=50)
+    parser.add_argument("--size", type=int, default=200, help="mean payload size in bytes")
+    parser.add_argument("--no-numpy", action="store_true")
+    args = parser.parse_args()
+
+    net = NetworkModel(
+        latency=LogNormal(median=0.05, sigma=0.5, offset=0.01),
+        bandwidth=1e6,
+        drop_rate=0.01,
+        dup_rate=0.001,
+        use_numpy=not args.no_numpy,
+    )
+    ids = [str(i) for i in range(args.nodes)]
+    for i in ids[: args.nodes // 2]:
+        net.set_link(i, ids[0], latency=Uniform(0.2, 0.4))
+    rand = random.Random(1)
+    links = [(rand.choice(ids), rand.choice(ids), rand.randint(1, 2 * args.size)) for _ in range(min(args.messages, 100000))]
+
+    start = time.perf_counter()
+    deliveries = 0
+    now = 0.0
+    for i in range(args.messages):
+        src, dst, size = links[i % len(links)]
+        deliveries += len(net.deliveries(src, dst, size, now))
+        now += 1e-4
+    elapsed = time.perf_counter() - start
+    print("numpy: {}, messages: {}, deliveries: {}".format(net.vectorized, args.messages, deliveries))
+    print("{:.2f} s, {:.0f} messages/s, stats: {}".format(elapsed, args.messages / elapsed, net.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark of the persistent sender outbox.
+
+Measures append throughput of put/commit/ack with different group commit sizes,
+recovery time of a log left by a crashed process, and checks that an exactly-once
+sender restarted in the middle of a lossy run delivers every message once.
+
+Usage: python benchmarks/outbox.py [--messages 100000] [--live 1000] [--restart 2000] [--dir /tmp]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnet import NetworkModel, Uniform  # noqa: E402
+from dslaboutbox import Outbox  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+from workloads import load_solution  # noqa: E402
+
+
+def append(path: str, messages: int, group_size: int, window: int = 32) -> dict:
+    # every put is committed like in a sender handler, messages are acked window orders later
+    outbox = Outbox(path, group_size=group_size)
+    start = time.perf_counter()
+    for order in range(messages):
+        outbox.put(order, "message {}".format(order))
+        outbox.commit()
+        if order >= window:
+            outbox.ack(order - window)
+    outbox.commit(force=True)
+    elapsed = time.perf_counter() - start
+    result = {"seconds": elapsed, "commits": outbox.commits, "compactions": outbox.compactions}
+    outbox.close()
+    return result
+
+
+def recovery(path: str, messages: int, live: int) -> dict:
+    # the writer is not closed, as if its process crashed
+    writer = Outbox(path)
+    for order in range(messages):
+        writer.put(order, "message {}".format(order))
+        if order >= live:
+            writer.ack(order - live)
+    start = time.perf_counter()
+    reader = Outbox(path)
+    recovered = reader.messages()
+    elapsed = time.perf_counter() - start
+    ok = sorted(recovered) == list(range(messages - live, messages)) and reader.next_order == messages
+    reader.close()
+    writer.close()
+    return {"seconds": elapsed, "recovered": len(recovered), "ok": ok}
+
+
+def restart(directory: str, messages: int, seed: int) -> dict:
+    # the sender is restarted halfway, messages in flight at the moment of the crash are lost
+    sol = load_solution("01-guarantees")
+    sol.OUTBOX_DIR = directory
+    receiver = sol.ExactlyOnceReceiver("receiver")
+    delivered = []
+    rand = random.Random(seed)
+    for phase, orders in enumerate((range(messages // 2), range(messages // 2, messages))):
+        net = NetworkModel(seed=seed + phase, latency=Uniform(0.5, 3.0), drop_rate=0.1, dup_rate=0.05)
+        sim = Simulation(seed=seed + phase, network=net)
+        start = time.perf_counter()
+        sim.add_process("sender", sol.ExactlyOnceSender("sender", "receiver"))
+        restart_seconds = time.perf_counter() - start
+        sim.add_process("receiver", receiver)
+        for i in orders:
+            sim.send_local_message("sender", Message("MESSAGE", {"text": "message {}".format(i)}))
+            sim.steps(rand.randint(0, 3))
+        if phase == 1:
+            sim.step_until_no_events()
+        delivered += [msg["text"] for msg in sim.read_local_messages("receiver")]
+    sol.OUTBOX_DIR = None
+    expected = ["message {}".format(i) for i in range(messages)]
+    return {
+        "delivered": len(delivered),
+        "unique": len(set(delivered)),
+        "ok": sorted(delivered) == sorted(expected),
+        "restart_seconds": restart_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--live", type=int, default=1000)
+    parser.add_argument("--restart", type=int, default=2000, help="messages in the restart check")
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--dir", help="directory for logs, a temporary one by default")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for group_size in (1, 8, 64):
+            res = append(os.path.join(directory, "append{}.outbox".format(group_size)), args.messages, group_size)
+            print("group size {:>3}: {:>9.0f} messages/s, {} commits, {} compactions".format(
+                group_size, args.messages / res["seconds"], res["commits"], res["compactions"]
+            ))
+        res = recovery(os.path.join(directory, "recovery.outbox"), args.messages, args.live)
+        print("recovery of {} live messages from a log of {}: {:.2f} ms{}".format(
+            res["recovered"], args.messages, res["seconds"] * 1000, "" if res["ok"] else " MISMATCH"
+        ))
+        res = restart(directory, args.restart, args.seed)
+        print("restart: {} delivered, {} unique, exactly once: {}, sender recovered in {:.2f} ms".format(
+            res["delivered"], res["unique"], res["ok"], res["restart_seconds"] * 1000
+        ))
+        if not res["ok"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
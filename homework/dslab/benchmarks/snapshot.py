@@ -0,0 +1,82 @@
+"""
+Compares Process.get_state/set_state with the binary snapshots from dslabstate.
+
+Usage: python benchmarks/snapshot.py [--keys 10000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Process  # noqa: E402
+from dslabstate import decode_snapshot, encode_snapshot, restore_snapshot, take_snapshot  # noqa: E402
+
+
+class StorageProcess(Process):
+    def __init__(self, keys: int):
+        self._id = "0"
+        self._nodes = [str(i) for i in range(10)]
+        self._data = {"key-{}".format(i): (float(i), "value-{}".format(i)) for i in range(keys)}
+        self._events = {"event-{}".format(i): {"type": "PUT", "resp": {}} for i in range(keys // 10)}
+
+
+def measure(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    proc = StorageProcess(args.keys)
+    state = proc.get_state()
+    base = take_snapshot(proc)
+    full = encode_snapshot(base)
+    compressed = encode_snapshot(base, compress=True)
+
+    # a typical step touches only the events member
+    proc._events["event-new"] = {"type": "GET", "resp": {}}
+    current = take_snapshot(proc, base)
+    delta = encode_snapshot(current, base)
+    shared = sum(1 for name, data in current.members.items() if base.members.get(name) is data)
+
+    rows = [
+        ("hex-pickle get_state", len(state), measure(proc.get_state, args.repeat)),
+        ("hex-pickle set_state", len(state), measure(lambda: proc.set_state(state), args.repeat)),
+        ("binary full", len(full), measure(lambda: encode_snapshot(take_snapshot(proc)), args.repeat)),
+        (
+            "binary full+zlib",
+            len(compressed),
+            measure(lambda: encode_snapshot(take_snapshot(proc), compress=True), args.repeat),
+        ),
+        (
+            "binary delta",
+            len(delta),
+            measure(lambda: encode_snapshot(take_snapshot(proc, base), base), args.repeat),
+        ),
+        (
+            "binary incremental",
+            len(delta),
+            measure(lambda: encode_snapshot(take_snapshot(proc, base, dirty=["_events"]), base), args.repeat),
+        ),
+        (
+            "binary restore",
+            len(full),
+            measure(lambda: restore_snapshot(proc, decode_snapshot(full)), args.repeat),
+        ),
+    ]
+    print("keys: {}, members shared with base: {}/{}".format(args.keys, shared, len(current.members)))
+    print("{:<24} {:>12} {:>10}".format("format", "bytes", "ms"))
+    for name, size, ms in rows:
+        print("{:<24} {:>12} {:>10.3f}".format(name, size, ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Runs reference workloads of homework processes and stores results as JSON.
+
+For every workload it reports throughput (client operations per second of wall-clock time),
+messages and bytes per operation, peak memory (tracemalloc) and total handler time (Profiler).
+With --compare results are compared with a previous run and regressions above --threshold are listed.
+
+Usage:
+    python benchmarks/suite.py [--only alo_flood,broadcast_flood] [--scale 1] [--json results.json]
+    python benchmarks/suite.py --json new.json --compare base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabprof import Profiler  # noqa: E402
+from workloads import WORKLOADS  # noqa: E402
+
+# metric -> True if larger is better
+METRICS = {
+    "ops_per_sec": True,
+    "msgs_per_op": False,
+    "bytes_per_op": False,
+    "peak_mb": False,
+    "handler_seconds": False,
+}
+
+
+def run_workload(name: str, scale: float, seed: int, track_memory: bool):
+    profiler = Profiler()
+    # some solutions use the random module directly
+    random.seed(seed)
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = WORKLOADS[name](scale, seed, profiler)
+    elapsed = time.perf_counter() - start
+    if track_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    ops = max(result["ops"], 1)
+    result.update({
+        "seconds": elapsed,
+        "ops_per_sec": result["ops"] / elapsed,
+        "msgs_per_op": result["messages"] / ops,
+        "bytes_per_op": result["bytes"] / ops,
+        "peak_mb": peak / 2 ** 20 if track_memory else None,
+        "handler_seconds": profiler.summary()["total_seconds"],
+    })
+    return result
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, current, threshold: float):
+    """
+    Prints relative changes of metrics and returns the list of regressions.
+    """
+    regressions = []
+    print("\n{:<24} {:<16} {:>12} {:>12} {:>8}".format("workload", "metric", "base", "current", "change"))
+    for name, res in current["workloads"].items():
+        prev = base["workloads"].get(name)
+        if prev is None:
+            continue
+        for metric, higher_better in METRICS.items():
+            old, new = prev.get(metric), res.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_better else change
+            mark = ""
+            if worse > threshold:
+                mark = " !"
+                regressions.append((name, metric, change))
+            print("{:<24} {:<16} {:>12.3f} {:>12.3f} {:>+7.1%}{}".format(name, metric, old, new, change, mark))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", help="comma-separated workloads to run (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument("--no-memory", action="store_true", help="disable tracemalloc, it slows down workloads")
+    parser.add_argument("--json", help="path to store results")
+    parser.add_argument("--compare", help="path to results of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as regression")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(WORKLOADS)
+    for name in names:
+        if name not in WORKLOADS:
+            parser.error("unknown workload {}, available: {}".format(name, ", ".join(WORKLOADS)))
+
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "scale": args.scale,
+            "seed": args.seed,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "workloads": dict(),
+    }
+    print("{:<24} {:>8} {:>9} {:>10} {:>9} {:>10} {:>9} {:>9}".format(
+        "workload", "ops", "done", "ops/s", "msgs/op", "bytes/op", "peak MB", "handler s"
+    ))
+    for name in names:
+        res = run_workload(name, args.scale, args.seed, not args.no_memory)
+        results["workloads"][name] = res
+        peak = "-" if res["peak_mb"] is None else "{:.1f}".format(res["peak_mb"])
+        print("{:<24} {:>8} {:>9} {:>10.0f} {:>9.2f} {:>10.1f} {:>9} {:>9.3f}".format(
+            name, res["ops"], res["completed"], res["ops_per_sec"], res["msgs_per_op"],
+            res["bytes_per_op"], peak, res["handler_seconds"]
+        ))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        regressions = compare(base, results, args.threshold)
+        if regressions:
+            print("\n{} regression(s) above {:.0%}".format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Seed sweep of GroupMember join convergence, run serially and in parallel.
+
+Every task joins --nodes members through one seed node with random network delays
+and checks that all members see the whole group.
+
+Usage: python benchmarks/sweep.py [--seeds 64] [--nodes 10] [--workers N] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnode import load_process_class  # noqa: E402
+from dslabpar import run_tasks, shared_state  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+
+IMPL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "06-membership", "solution.py")
+
+_classes = dict()
+
+
+def join_convergence(seed: int, nodes: int, duration: float) -> dict:
+    impl = shared_state()["impl"]
+    if impl not in _classes:
+        _classes[impl] = load_process_class(impl, "GroupMember")
+    cls = _classes[impl]
+
+    sim = Simulation(seed=seed, min_delay=0.1, max_delay=0.5)
+    ids = [str(i) for i in range(nodes)]
+    for proc_id in ids:
+        sim.add_process(proc_id, cls(proc_id))
+    for proc_id in ids:
+        sim.send_local_message(proc_id, Message("JOIN", {"seed": ids[0]}))
+    sim.step_until_time(duration)
+    converged = True
+    for proc_id in ids:
+        sim.send_local_message(proc_id, Message("GET_MEMBERS", {}))
+        members = sim.read_local_messages(proc_id)[-1]["members"]
+        converged = converged and sorted(members) == sorted(ids)
+    return {"converged": converged, "messages": sim.message_count, "events": sim.event_count}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seeds", type=int, default=64)
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--impl", default=IMPL)
+    parser.add_argument("--json", help="path to store results")
+    args = parser.parse_args()
+
+    seeds = range(args.seeds)
+    params = [{"nodes": args.nodes, "duration": args.duration}]
+    shared = {"impl": os.path.abspath(args.impl)}
+    serial = run_tasks(join_convergence, seeds, params, shared, workers=1)
+    parallel = run_tasks(join_convergence, seeds, params, shared, workers=args.workers)
+
+    metrics = [(res.seed, res.metrics) for res in serial.results]
+    if metrics != [(res.seed, res.metrics) for res in parallel.results]:
+        print("WARNING: parallel results differ from serial ones")
+    for res in parallel.failures:
+        print("seed {} failed:\n{}".format(res.seed, res.error))
+
+    print("seeds: {}, nodes: {}".format(args.seeds, args.nodes))
+    print("serial: {:.2f} s, parallel ({} workers): {:.2f} s, speedup: {:.1f}x".format(
+        serial.wall_seconds, parallel.workers, parallel.wall_seconds, serial.wall_seconds / parallel.wall_seconds
+    ))
+    for key, stats in parallel.aggregate().items():
+        print("{:<10} mean {:>10.2f} min {:>10.0f} max {:>10.0f}".format(key, stats["mean"], stats["min"], stats["max"]))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(parallel.to_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
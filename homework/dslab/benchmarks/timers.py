@@ -0,0 +1,104 @@
+"""
+Microbenchmark of timer backends with many concurrent timers.
+
+Every timer is scheduled, overridden several times like a retransmission timer,
+a part of timers is cancelled and the rest is drained in deadline order.
+The second table resets one timer as many times as there are other pending timers (--resets),
+the earliest deadline is queried after every reset as the simulation does.
+
+Usage: python benchmarks/timers.py [--timers 100000] [--overrides 3] [--resets 10000 40000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabtimers import TimerHeap, TimerWheel  # noqa: E402
+
+
+def run(backend, timers: int, overrides: int, seed: int):
+    rand = random.Random(seed)
+    keys = [("sender", str(i)) for i in range(timers)]
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    now = 0.0
+    for key in keys:
+        backend.set(key, now + rand.uniform(1, 10))
+    for _ in range(overrides):
+        now += 1
+        for key in keys:
+            backend.set(key, now + rand.uniform(1, 10))
+    scheduled = time.perf_counter()
+    # the heap keeps overridden entries until they reach the top, the wheel stores live timers only
+    stored = len(backend._heap) if isinstance(backend, TimerHeap) else len(backend) + len(backend._ready)
+    for key in keys[::4]:
+        backend.cancel(key)
+    cancelled = time.perf_counter()
+
+    fired = 0
+    while True:
+        deadline = backend.next_deadline()
+        if deadline is None:
+            break
+        fired += len(backend.pop_expired(deadline))
+    drained = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "set": scheduled - start,
+        "cancel": cancelled - scheduled,
+        "drain": drained - cancelled,
+        "fired": fired,
+        "stored": stored,
+        "peak_mb": peak / 2 ** 20,
+    }
+
+
+def run_resets(backend, timers: int, resets: int, seed: int) -> float:
+    rand = random.Random(seed)
+    for i in range(timers):
+        backend.set(("sender", str(i)), rand.uniform(1, 10))
+    start = time.perf_counter()
+    for _ in range(resets):
+        backend.set(("sender", "ack"), rand.uniform(0.5, 10))
+        backend.next_deadline()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--timers", type=int, default=100000)
+    parser.add_argument("--overrides", type=int, default=3)
+    parser.add_argument("--resets", type=int, nargs="+", default=[10000, 40000])
+    parser.add_argument("--seed", type=int, default=123)
+    args = parser.parse_args()
+
+    backends = [
+        ("heap", TimerHeap()),
+        ("wheel (0.1)", TimerWheel(resolution=0.1)),
+        ("wheel (0.01)", TimerWheel(resolution=0.01)),
+    ]
+    print("timers: {}, overrides per timer: {}".format(args.timers, args.overrides))
+    print("{:<14} {:>9} {:>9} {:>9} {:>9} {:>9} {:>10}".format(
+        "backend", "set s", "cancel s", "drain s", "fired", "stored", "peak MB"
+    ))
+    for name, backend in backends:
+        res = run(backend, args.timers, args.overrides, args.seed)
+        print("{:<14} {:>9.3f} {:>9.3f} {:>9.3f} {:>9} {:>9} {:>10.1f}".format(
+            name, res["set"], res["cancel"], res["drain"], res["fired"], res["stored"], res["peak_mb"]
+        ))
+
+    print()
+    print("{:<14} {}".format("backend", " ".join("{:>9}".format("{} s".format(n)) for n in args.resets)))
+    for name, factory in (("heap", TimerHeap), ("wheel (0.1)", lambda: TimerWheel(0.1))):
+        times = [run_resets(factory(), n, n, args.seed) for n in args.resets]
+        print("{:<14} {}".format(name, " ".join("{:>9.3f}".format(t) for t in times)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Reference workloads for homework processes, used by benchmarks/suite.py.
+
+Every workload runs a simulation of one solution and returns the number of client operations,
+completed operations and simulation counters. Sizes are multiplied by scale.
+"""
+import os
+import random
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from dslabmp import Message  # noqa: E402
+from dslabnet import LogNormal, NetworkModel, Uniform  # noqa: E402
+from dslabnode import load_module  # noqa: E402
+from dslabprof import Profiler  # noqa: E402
+from dslabsim import Simulation  # noqa: E402
+
+HOMEWORK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+
+
+def load_solution(task: str):
+    """
+    Loads homework/<task>/solution.py once per process.
+    """
+    return load_module(os.path.join(HOMEWORK, task, "solution.py"), "solution_" + task.replace("-", "_"))
+
+
+def _result(sim: Simulation, ops: int, completed: int) -> Dict[str, Any]:
+    return {
+        "ops": ops,
+        "completed": completed,
+        "messages": sim.message_count,
+        "bytes": sim.traffic,
+        "events": sim.event_count,
+        "sim_time": sim.time(),
+    }
+
+
+def _guarantees_flood(sender_cls: str, receiver_cls: str, scale: float, seed: int, profiler: Profiler):
+    # lossy network with duplicates and reordering, the sender gets a burst of messages
+    sol = load_solution("01-guarantees")
+    net = NetworkModel(seed=seed, latency=Uniform(0.5, 3.0), drop_rate=0.1, dup_rate=0.05)
+    sim = Simulation(seed=seed, network=net, profiler=profiler)
+    sim.add_process("sender", getattr(sol, sender_cls)("sender", "receiver"))
+    sim.add_process("receiver", getattr(sol, receiver_cls)("receiver"))
+    rand = random.Random(seed)
+    ops = int(2000 * scale)
+    for i in range(ops):
+        sim.send_local_message("sender", Message("MESSAGE", {"text": "message {}".format(i)}))
+        sim.steps(rand.randint(0, 3))
+    sim.step_until_no_events()
+    return _result(sim, ops, len(sim.read_local_messages("receiver")))
+
+
+def alo_flood(scale: float, seed: int, profiler: Profiler):
+    return _guarantees_flood("AtLeastOnceSender", "AtLeastOnceReceiver", scale, seed, profiler)
+
+
+def eo_flood(scale: float, seed: int, profiler: Profiler):
+    return _guarantees_flood("ExactlyOnceSender", "ExactlyOnceReceiver", scale, seed, profiler)
+
+
+def eoo_flood(scale: float, seed: int, profiler: Profiler):
+    return _guarantees_flood("ExactlyOnceOrderedSender", "ExactlyOnceOrderedReceiver", scale, seed, profiler)
+
+
+def broadcast_flood(scale: float, seed: int, profiler: Profiler):
+    # every process broadcasts concurrently with the others
+    sol = load_solution("04-broadcast")
+    net = NetworkModel(seed=seed, latency=LogNormal(median=1.0, sigma=0.5))
+    sim = Simulation(seed=seed, network=net, profiler=profiler)
+    ids = [str(i) for i in range(10)]
+    for proc_id in ids:
+        sim.add_process(proc_id, sol.BroadcastProcess(proc_id, ids))
+    rand = random.Random(seed)
+    ops = int(200 * scale)
+    for i in range(ops):
+        sim.send_local_message(rand.choice(ids), Message("SEND", {"text": "message {}".format(i)}))
+        sim.steps(rand.randint(0, 20))
+    sim.step_until_no_events()
+    completed = min(len(sim.read_local_messages(proc_id)) for proc_id in ids)
+    return _result(sim, ops, completed)
+
+
+def membership_churn(scale: float, seed: int, profiler: Profiler):
+    # members join through one seed, then random members leave and rejoin
+    sol = load_solution("06-membership")
+    sim = Simulation(seed=seed, min_delay=0.1, max_delay=0.5, profiler=profiler)
+    ids = [str(i) for i in range(20)]
+    for proc_id in ids:
+        sim.add_process(proc_id, sol.GroupMember(proc_id))
+    for proc_id in ids:
+        sim.send_local_message(proc_id, Message("JOIN", {"seed": ids[0]}))
+    sim.step_until_time(sim.time() + 20)
+
+    def members(proc_id: str) -> set:
+        sim.send_local_message(proc_id, Message("GET_MEMBERS", {}))
+        return set(sim.read_local_messages(proc_id)[-1]["members"])
+
+    # an operation is completed once the seed, which never leaves, sees its effect
+    rand = random.Random(seed)
+    ops = len(ids)
+    completed = len(members(ids[0]) & set(ids))
+    for _ in range(int(20 * scale)):
+        proc_id = rand.choice(ids[1:])
+        sim.send_local_message(proc_id, Message("LEAVE", {}))
+        sim.step_until_time(sim.time() + 5)
+        completed += proc_id not in members(ids[0])
+        sim.send_local_message(proc_id, Message("JOIN", {"seed": ids[0]}))
+        sim.step_until_time(sim.time() + 5)
+        completed += proc_id in members(ids[0])
+        ops += 2
+    sim.step_until_time(sim.time() + 30)
+    converged = sum(members(proc_id) == set(ids) for proc_id in ids)
+    result = _result(sim, ops, completed)
+    result["converged"] = converged
+    return result
+
+
+def sharding_sweep(scale: float, seed: int, profiler: Profiler):
+    # fills the key space, reads every key back, then adds and removes nodes
+    sol = load_solution("07-kv-sharding")
+    sim = Simulation(seed=seed, min_delay=0.1, max_delay=1.0, profiler=profiler)
+    ids = [str(i) for i in range(10)]
+    for proc_id in ids:
+        sim.add_process(proc_id, sol.StorageNode(proc_id, ids))
+    all_ids = list(ids)
+    rand = random.Random(seed)
+    keys = ["key{}".format(i) for i in range(int(2000 * scale))]
+    ops = 0
+    for step in ("PUT", "GET"):
+        for key in keys:
+            data = {"key": key, "value": "value-" + key} if step == "PUT" else {"key": key}
+            sim.send_local_message(rand.choice(ids), Message(step, data))
+            ops += 1
+        sim.step_until_no_events()
+    for added in ("10", "11"):
+        members = ids + [added]
+        sim.add_process(added, sol.StorageNode(added, members))
+        all_ids.append(added)
+        ids = members
+        for proc_id in ids:
+            sim.send_local_message(proc_id, Message("NODE_ADDED", {"id": added}))
+        sim.step_until_no_events()
+        ops += 1
+    for removed in ("3", "10"):
+        for proc_id in ids:
+            sim.send_local_message(proc_id, Message("NODE_REMOVED", {"id": removed}))
+        sim.step_until_no_events()
+        ids = [proc_id for proc_id in ids if proc_id != removed]
+        ops += 1
+    completed = sum(len(sim.read_local_messages(proc_id)) for proc_id in all_ids)
+    return _result(sim, ops, completed)
+
+
+def replication_partitions(scale: float, seed: int, profiler: Profiler):
+    # quorum reads and writes while the network is repeatedly partitioned and healed
+    sol = load_solution("08-kv-replication")
+    net = NetworkModel(seed=seed, latency=Uniform(0.1, 0.5))
+    sim = Simulation(seed=seed, network=net, profiler=profiler)
+    ids = [str(i) for i in range(6)]
+    for proc_id in ids:
+        sim.add_process(proc_id, sol.StorageNode(proc_id, ids))
+    rand = random.Random(seed)
+    keys = ["key{}".format(i) for i in range(100)]
+    ops = 0
+    for storm in range(int(20 * scale)):
+        if storm % 2 == 0:
+            shuffled = rand.sample(ids, len(ids))
+            net.partition([shuffled[:4], shuffled[4:]])
+        else:
+            net.heal()
+        for _ in range(50):
+            key = rand.choice(keys)
+            if rand.random() < 0.5:
+                msg = Message("PUT", {"key": key, "value": str(rand.random()), "quorum": 2})
+            else:
+                msg = Message("GET", {"key": key, "quorum": 2})
+            sim.send_local_message(rand.choice(ids), msg)
+            sim.steps(rand.randint(0, 10))
+            ops += 1
+        sim.step_until_time(sim.time() + 5)
+    net.heal()
+    sim.step_until_time(sim.time() + 30)
+    completed = sum(len(sim.read_local_messages(proc_id)) for proc_id in ids)
+    return _result(sim, ops, completed)
+
+
+WORKLOADS = {
+    "alo_flood": alo_flood,
+    "eo_flood": eo_flood,
+    "eoo_flood": eoo_flood,
+    "broadcast_flood": broadcast_flood,
+    "membership_churn": membership_churn,
+    "sharding_sweep": sharding_sweep,
+    "replication_partitions": replication_partitions,
+}
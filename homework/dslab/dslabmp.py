@@ -1,14 +1,31 @@
 from __future__ import annotations
 import abc
+import hashlib
 import json
 import pickle
-from typing import Any, Dict, List, Tuple, Union
+import struct
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Type, Union
 
 
 JSON = Union[Dict[str, "JSON"], List["JSON"], str, int, float, bool, None]
 
+# Message payload transports supported by Context:
+# - json: payloads are serialized to JSON strings (default, used by the test harness)
+# - copy: payloads are copied as if they went through a JSON round trip, without encoding
+# - ref: payloads are passed by reference, only for runtimes within the same interpreter
+TRANSPORT_JSON = "json"
+TRANSPORT_COPY = "copy"
+TRANSPORT_REF = "ref"
+TRANSPORTS = (TRANSPORT_JSON, TRANSPORT_COPY, TRANSPORT_REF)
+
+# Type of envelopes packing several messages to the same destination (see Context coalesce)
+ENVELOPE_TYPE = "__ENVELOPE__"
+
 
 class Message:
+    __slots__ = ("_type", "_data")
+
     def __init__(self, message_type: str, data: Dict[str, Any]):
         self._type = message_type
         self._data = data
@@ -26,16 +43,195 @@ class Message:
     def remove(self, key: str):
         self._data.pop(key, None)
 
+    def copy(self) -> Message:
+        """
+        Returns a shallow copy of the message.
+        """
+        return Message(self._type, dict(self._data))
+
     @staticmethod
     def from_json(message_type: str, json_str: str) -> Message:
-        return Message(message_type, json.loads(json_str))
+        """
+        Builds a message from a JSON payload, registered schemas are used as in decode_message.
+        """
+        return decode_message(message_type, json_str)
+
+
+class _FieldsSnapshot(dict):
+    # _data of schema messages is built from their fields on every access,
+    # writes to it would be lost, so they fail instead
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('_data of a schema message is a read-only snapshot, use msg[key] = value')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    pop = popitem = clear = update = setdefault = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class _SchemaMessage(Message):
+    __slots__ = ()
+    _fields: frozenset = frozenset()
+    _field_order: Tuple[str, ...] = ()
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._fields:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self._fields:
+            raise KeyError('{} has no field {}'.format(self._type, key))
+        setattr(self, key, value)
+
+    def remove(self, key: str):
+        if key in self._fields and hasattr(self, key):
+            delattr(self, key)
+
+    def replace(self, **changes) -> Message:
+        """
+        Returns a copy of the message with the specified fields replaced.
+        """
+        msg = self.copy()
+        for key, value in changes.items():
+            msg[key] = value
+        return msg
+
+    def _partial_data(self) -> Dict[str, Any]:
+        data = dict()
+        for field in self._field_order:
+            if hasattr(self, field):
+                data[field] = getattr(self, field)
+        return _FieldsSnapshot(data)
+
+    def __reduce__(self):
+        return decode_message, (self._type, self._data)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Message:
+        msg = cls(**data)
+        for field in cls._field_order:
+            if field not in data:
+                delattr(msg, field)
+        return msg
+
+
+_SCHEMAS: Dict[str, Type[Message]] = dict()
+_RESERVED_FIELDS = {"type", "remove", "copy", "replace", "from_json", "from_dict"}
+
+
+def message_schema(message_type: str, fields: Sequence[str], register: bool = True) -> Type[Message]:
+    """
+    Generates a Message subclass with __slots__ for the declared fields.
+
+    Fields are accessed directly as attributes (msg.key) while msg["key"] keeps working.
+    Missing fields default to None, removed fields are omitted from the payload.
+    msg._data is a read-only snapshot of the fields, writing to it raises TypeError.
+    Registered schemas are used by decode_message for incoming messages of this type.
+    """
+    fields = tuple(fields)
+    for field in fields:
+        if not field.isidentifier() or field.startswith("_") or field in _RESERVED_FIELDS:
+            raise ValueError('invalid field name {}'.format(field))
+    if len(set(fields)) != len(fields):
+        raise ValueError('duplicate field names in {}'.format(fields))
+
+    args = ", ".join("{}=None".format(f) for f in fields)
+    init_body = "".join("    self.{0} = {0}\n".format(f) for f in fields) or "    pass\n"
+    dict_items = ", ".join("{0!r}: self.{0}".format(f) for f in fields)
+    copy_args = ", ".join("self.{}".format(f) for f in fields)
+    source = (
+        "def __init__(self, {args}):\n{init_body}"
+        "def _data(self):\n"
+        "    try:\n"
+        "        return _FieldsSnapshot({{{dict_items}}})\n"
+        "    except AttributeError:\n"
+        "        return self._partial_data()\n"
+        "def copy(self):\n"
+        "    try:\n"
+        "        return self.__class__({copy_args})\n"
+        "    except AttributeError:\n"
+        "        return self.__class__.from_dict(self._partial_data())\n"
+    ).format(args=args, init_body=init_body, dict_items=dict_items, copy_args=copy_args)
+    namespace: Dict[str, Any] = {"_FieldsSnapshot": _FieldsSnapshot}
+    exec(source, namespace)
+
+    class_name = "".join(part.capitalize() for part in message_type.split("_")) + "Message"
+    cls = type(class_name, (_SchemaMessage,), {
+        "__slots__": fields,
+        "_type": message_type,
+        "_fields": frozenset(fields),
+        "_field_order": fields,
+        "__init__": namespace["__init__"],
+        "_data": property(namespace["_data"]),
+        "copy": namespace["copy"],
+    })
+    if register:
+        _SCHEMAS[message_type] = cls
+    return cls
+
+
+def get_message_schema(message_type: str) -> Union[Type[Message], None]:
+    return _SCHEMAS.get(message_type)
+
+
+def _json_key(key: Any) -> str:
+    if isinstance(key, str):
+        return key
+    if key is None or isinstance(key, (bool, int, float)):
+        return json.dumps(key)
+    raise TypeError('keys must be str, int, float, bool or None, not {}'.format(type(key)))
+
+
+def copy_json(value: Any) -> JSON:
+    """
+    Returns a copy of a JSON-serializable value equal to json.loads(json.dumps(value)).
+    Raises TypeError if the value is not JSON-serializable.
+    """
+    if isinstance(value, dict):
+        return {_json_key(k): copy_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [copy_json(v) for v in value]
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+def check_json(value: Any):
+    """
+    Checks that a value is JSON-serializable without copying it.
+    Raises TypeError otherwise.
+    """
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _json_key(k)
+            check_json(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            check_json(v)
+    elif not (value is None or isinstance(value, (str, int, float))):
+        raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
 
 
 class Context(object):
-    def __init__(self, time: float):
+    def __init__(self, time: float, transport: str = TRANSPORT_JSON, validate: bool = False, coalesce: bool = False):
+        if transport not in TRANSPORTS:
+            raise ValueError('unknown transport {}'.format(transport))
         self._time = time
-        self._sent_messages: List[Tuple[str, str, str]] = list()
-        self._sent_local_messages: List[tuple[str, str]] = list()
+        self._transport = transport
+        self._validate = validate
+        # with coalesce enabled messages are buffered per destination until _flush()
+        self._coalesce = coalesce
+        self._outbox: Dict[str, List[Tuple[str, Any]]] = dict()
+        # payloads are JSON strings for the json transport and dicts otherwise
+        self._sent_messages: List[Tuple[str, Any, str]] = list()
+        self._sent_local_messages: List[tuple[str, Any]] = list()
         self._timer_actions: List[Tuple[str, float, bool]] = list()
 
     def send(self, msg: Message, to: str):
@@ -46,7 +242,23 @@ class Context(object):
             raise ValueError('message type length exceeds the limit of 50 characters')
         if not isinstance(to, str):
             raise TypeError('to argument has to be string, not {}'.format(type(to)))
-        self._sent_messages.append((msg.type, json.dumps(msg._data), to))
+        self._enqueue(msg.type, self._encode(msg._data), to)
+
+    def send_many(self, msg: Message, destinations: Iterable[str]):
+        """
+        Sends a message to each of the specified processes, the payload is encoded once.
+        """
+        if len(msg.type) > 50:
+            raise ValueError('message type length exceeds the limit of 50 characters')
+        destinations = list(destinations)
+        for to in destinations:
+            if not isinstance(to, str):
+                raise TypeError('to argument has to be string, not {}'.format(type(to)))
+        if not destinations:
+            return
+        payload = self._encode(msg._data)
+        for to in destinations:
+            self._enqueue(msg.type, payload, to)
 
     def send_local(self, msg: Message):
         """
@@ -54,7 +266,7 @@ class Context(object):
         """
         if len(msg.type) > 50:
             raise ValueError('message type length exceeds the limit of 50 characters')
-        self._sent_local_messages.append((msg.type, json.dumps(msg._data)))
+        self._sent_local_messages.append((msg.type, self._encode(msg._data)))
 
     def set_timer(self, timer_name: str, delay: float):
         """
@@ -100,8 +312,173 @@ class Context(object):
         """
         return self._time
 
+    def _enqueue(self, msg_type: str, payload: Any, to: str):
+        if self._coalesce:
+            self._outbox.setdefault(to, []).append((msg_type, payload))
+        else:
+            self._sent_messages.append((msg_type, payload, to))
+
+    def _flush(self):
+        """
+        Moves coalesced messages to _sent_messages, packing messages to the same destination into one envelope.
+        """
+        for to, messages in self._outbox.items():
+            if len(messages) == 1:
+                msg_type, payload = messages[0]
+                self._sent_messages.append((msg_type, payload, to))
+            elif self._transport == TRANSPORT_JSON:
+                payload = "[" + ",".join("[{},{}]".format(json.dumps(t), p) for t, p in messages) + "]"
+                self._sent_messages.append((ENVELOPE_TYPE, payload, to))
+            else:
+                self._sent_messages.append((ENVELOPE_TYPE, list(messages), to))
+        self._outbox.clear()
+
+    def _encode(self, data: Dict[str, Any]) -> Any:
+        if self._transport == TRANSPORT_JSON:
+            return json.dumps(data)
+        if self._transport == TRANSPORT_COPY:
+            return copy_json(data)
+        if self._validate:
+            check_json(data)
+        return data
+
+
+def unpack_envelope(payload: Any) -> List[Tuple[str, Any]]:
+    """
+    Returns (message type, payload) pairs packed into an envelope by Context.
+    """
+    if isinstance(payload, str):
+        return [(msg_type, data) for msg_type, data in json.loads(payload)]
+    return payload
+
+
+def decode_message(message_type: str, payload: Any) -> Message:
+    """
+    Builds a message from a payload produced by Context with any transport.
+    """
+    shared = not isinstance(payload, str)
+    if not shared:
+        payload = json.loads(payload)
+    schema = _SCHEMAS.get(message_type)
+    if schema is not None and schema._fields.issuperset(payload):
+        return schema.from_dict(payload)
+    # top-level copy keeps receivers from mutating each other's view of a shared payload
+    return Message(message_type, dict(payload) if shared else payload)
+
+
+_MASK64 = (1 << 64) - 1
+_TAG_INT = 0x243F6A8885A308D3
+_TAG_FLOAT = 0x13198A2E03707344
+_TAG_SEQ = 0xA4093822299F31D0
+_TAG_DICT = 0x082EFA98EC4E6C89
+_TAG_SET = 0x452821E638D01377
+_TAG_VALUE = 0xBE5466CF34E90C6C
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _digest(tag: bytes, data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8, person=tag).digest(), "little")
+
+
+def _pair_hash(key_hash: int, value_hash: int) -> int:
+    return _mix64((key_hash + _mix64(value_hash ^ _TAG_VALUE)) & _MASK64)
+
+
+# type -> attribute names of its __slots__ and the slots of its bases, sorted
+_SLOT_NAMES: Dict[type, Tuple[str, ...]] = dict()
+
+
+def _slot_names(cls: type) -> Tuple[str, ...]:
+    names = _SLOT_NAMES.get(cls)
+    if names is None:
+        found = set()
+        for klass in cls.__mro__:
+            slots = klass.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot in ("__dict__", "__weakref__"):
+                    continue
+                if slot.startswith("__") and not slot.endswith("__"):
+                    # private slots are stored under mangled names
+                    slot = "_{}{}".format(klass.__name__.lstrip("_"), slot)
+                found.add(slot)
+        names = _SLOT_NAMES[cls] = tuple(sorted(found))
+    return names
+
+
+def state_fingerprint(value: Any) -> int:
+    """
+    Returns a 64-bit fingerprint of a value that does not depend on the iteration order
+    of dicts and sets and is stable across interpreter runs (unlike hash()).
+    Lists and tuples with equal items have equal fingerprints, as after a JSON round trip.
+    Objects are fingerprinted by their class name, __dict__ and __slots__, classes by their name.
+    Raises TypeError for values that can be neither traversed nor pickled.
+    """
+    if value is None:
+        return _mix64(1)
+    if value is True or value is False:
+        return _mix64(2 + value)
+    if isinstance(value, int):
+        if -(1 << 63) <= value < (1 << 63):
+            return _mix64(_mix64(value & _MASK64) ^ _TAG_INT)
+        return _digest(b"i", str(value).encode("ascii"))
+    if isinstance(value, float):
+        return _mix64(_mix64(struct.unpack("<Q", struct.pack("<d", value))[0]) ^ _TAG_FLOAT)
+    if isinstance(value, str):
+        return _digest(b"s", value.encode("utf8", "surrogatepass"))
+    if isinstance(value, bytes):
+        return _digest(b"b", value)
+    if isinstance(value, (list, tuple)):
+        acc = _mix64(_TAG_SEQ + len(value))
+        for item in value:
+            acc = _mix64(acc ^ state_fingerprint(item))
+        return acc
+    if isinstance(value, dict):
+        acc = 0
+        for k, v in value.items():
+            acc += _pair_hash(state_fingerprint(k), state_fingerprint(v))
+        return _mix64((acc ^ _TAG_DICT ^ len(value)) & _MASK64)
+    if isinstance(value, (set, frozenset)):
+        acc = 0
+        for item in value:
+            acc += state_fingerprint(item)
+        return _mix64((acc ^ _TAG_SET ^ len(value)) & _MASK64)
+    if isinstance(value, type):
+        return _digest(b"t", "{}.{}".format(value.__module__, value.__qualname__).encode("utf8"))
+    slots = _slot_names(type(value))
+    if slots or hasattr(value, "__dict__"):
+        fields = getattr(value, "__dict__", None)
+        if slots:
+            fields = dict(fields or ())
+            for slot in slots:
+                if hasattr(value, slot):
+                    fields[slot] = getattr(value, slot)
+        name = type(value).__qualname__.encode("utf8")
+        return _pair_hash(_digest(b"o", name), state_fingerprint(fields))
+    try:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        raise TypeError('cannot fingerprint object of type {}: {}'.format(type(value).__name__, e)) from e
+    return _digest(b"p", data)
+
+
+# Process -> (member fingerprints, combined fingerprint), kept outside of the process
+# so that get_state() does not see it
+_state_hashes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
 
 class Process:
+    def on_start(self, ctx: Context):
+        """
+        This method is called once when the process is started, before any other event.
+        """
+
     @abc.abstractmethod
     def on_local_message(self, msg: Message, ctx: Context):
         """
@@ -134,7 +511,33 @@ class Process:
         This method restores the process state by its string representation.
         """
         data = json.loads(state_encoded)
+        _state_hashes.pop(self, None)
         for name in self.__dict__:
             self.__dict__[name] = None
         for name, member in data.items():
             self.__dict__[name] = pickle.loads(bytes.fromhex(member))
+
+    def state_hash(self, dirty: Optional[Iterable[str]] = None) -> int:
+        """
+        This method returns a canonical 64-bit hash of process state.
+        Equal states have equal hashes regardless of dict and set ordering.
+        If dirty is given, only these members are hashed again and the rest is taken from the previous call.
+        """
+        cache = _state_hashes.get(self)
+        if cache is None or dirty is None:
+            members = {name: state_fingerprint(member) for name, member in self.__dict__.items()}
+            total = 0
+            for name, member_hash in members.items():
+                total += _pair_hash(_digest(b"m", name.encode("utf8")), member_hash)
+        else:
+            members, total = cache
+            for name in dirty:
+                name_hash = _digest(b"m", name.encode("utf8"))
+                if name in members:
+                    total -= _pair_hash(name_hash, members.pop(name))
+                if name in self.__dict__:
+                    members[name] = state_fingerprint(self.__dict__[name])
+                    total += _pair_hash(name_hash, members[name])
+        total &= _MASK64
+        _state_hashes[self] = (members, total)
+        return total
@@ -0,0 +1,266 @@
+from __future__ import annotations
+import math
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Latency:
+    """
+    Distribution of one-way link latency.
+
+    Values are sampled in batches: with NumPy a whole batch is drawn by one vectorized call,
+    otherwise the random module is used with the same interface.
+    """
+
+    def __init__(self, batch: int = 4096):
+        self._batch = batch
+        self._buffer: List[float] = []
+        self._pos = 0
+
+    def sample(self, rng: _Rng) -> float:
+        if self._pos >= len(self._buffer):
+            self._buffer = self._draw(rng, self._batch)
+            self._pos = 0
+        value = self._buffer[self._pos]
+        self._pos += 1
+        return value
+
+    def _draw(self, rng: _Rng, n: int) -> List[float]:
+        raise NotImplementedError
+
+
+class Constant(Latency):
+    def __init__(self, delay: float):
+        super().__init__()
+        self._delay = delay
+
+    def sample(self, rng: _Rng) -> float:
+        return self._delay
+
+
+class Uniform(Latency):
+    def __init__(self, low: float, high: float, batch: int = 4096):
+        super().__init__(batch)
+        if low < 0 or high < low:
+            raise ValueError('invalid latency range [{}, {}]'.format(low, high))
+        self._low = low
+        self._high = high
+
+    def _draw(self, rng: _Rng, n: int) -> List[float]:
+        if rng.np is not None:
+            return rng.np.uniform(self._low, self._high, n).tolist()
+        return [rng.py.uniform(self._low, self._high) for _ in range(n)]
+
+
+class Normal(Latency):
+    """
+    Normal latency truncated at minimum.
+    """
+
+    def __init__(self, mean: float, std: float, minimum: float = 0.0, batch: int = 4096):
+        super().__init__(batch)
+        self._mean = mean
+        self._std = std
+        self._min = minimum
+
+    def _draw(self, rng: _Rng, n: int) -> List[float]:
+        if rng.np is not None:
+            return np.maximum(rng.np.normal(self._mean, self._std, n), self._min).tolist()
+        return [max(rng.py.gauss(self._mean, self._std), self._min) for _ in range(n)]
+
+
+class LogNormal(Latency):
+    """
+    Heavy-tailed latency: offset plus a log-normal variable with the given median and sigma.
+    """
+
+    def __init__(self, median: float, sigma: float, offset: float = 0.0, batch: int = 4096):
+        super().__init__(batch)
+        self._mu = math.log(median)
+        self._sigma = sigma
+        self._offset = offset
+
+    def _draw(self, rng: _Rng, n: int) -> List[float]:
+        if rng.np is not None:
+            return (rng.np.lognormal(self._mu, self._sigma, n) + self._offset).tolist()
+        return [rng.py.lognormvariate(self._mu, self._sigma) + self._offset for _ in range(n)]
+
+
+class Exponential(Latency):
+    def __init__(self, mean: float, offset: float = 0.0, batch: int = 4096):
+        super().__init__(batch)
+        self._mean = mean
+        self._offset = offset
+
+    def _draw(self, rng: _Rng, n: int) -> List[float]:
+        if rng.np is not None:
+            return (rng.np.exponential(self._mean, n) + self._offset).tolist()
+        return [rng.py.expovariate(1.0 / self._mean) + self._offset for _ in range(n)]
+
+
+class _Rng:
+    # NumPy generator if available, the random module otherwise
+    def __init__(self, seed: int, use_numpy: bool):
+        self.py = random.Random(seed)
+        self.np = np.random.default_rng(seed) if use_numpy and np is not None else None
+        self._uniform: List[float] = []
+        self._pos = 0
+
+    def uniform01(self, batch: int = 4096) -> float:
+        if self._pos >= len(self._uniform):
+            if self.np is not None:
+                self._uniform = self.np.random(batch).tolist()
+            else:
+                self._uniform = [self.py.random() for _ in range(batch)]
+            self._pos = 0
+        value = self._uniform[self._pos]
+        self._pos += 1
+        return value
+
+
+class Link:
+    """
+    Properties of a directed link, None values fall back to the network defaults.
+    Bandwidth is in bytes per time unit.
+    """
+
+    __slots__ = ("latency", "bandwidth", "drop_rate", "dup_rate")
+
+    def __init__(
+        self,
+        latency: Optional[Latency] = None,
+        bandwidth: Optional[float] = None,
+        drop_rate: Optional[float] = None,
+        dup_rate: Optional[float] = None,
+    ):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.drop_rate = drop_rate
+        self.dup_rate = dup_rate
+
+
+class NetworkModel:
+    """
+    Network model for Simulation: per-link latency distributions, bandwidth, loss, duplication and partitions.
+
+    A message of size bytes sent over a link with limited bandwidth is transmitted after
+    the messages queued before it on the same link and takes size / bandwidth to transmit,
+    then it travels for a sampled latency. Message size is the length of the serialized payload.
+    """
+
+    def __init__(
+        self,
+        seed: int = 123,
+        latency: Optional[Latency] = None,
+        bandwidth: Optional[float] = None,
+        drop_rate: float = 0.0,
+        dup_rate: float = 0.0,
+        use_numpy: bool = True,
+    ):
+        self._rng = _Rng(seed, use_numpy)
+        self._default = Link(latency or Constant(1.0), bandwidth, drop_rate, dup_rate)
+        self._links: Dict[Tuple[str, str], Link] = dict()
+        # time until which each link is busy transmitting
+        self._busy: Dict[Tuple[str, str], float] = dict()
+        self._groups: Optional[Dict[str, int]] = None
+        self._disconnected: set = set()
+        self.sent_count = 0
+        self.dropped_count = 0
+        self.duplicated_count = 0
+        self.bytes_sent = 0
+
+    @property
+    def vectorized(self) -> bool:
+        return self._rng.np is not None
+
+    def set_link(
+        self,
+        src: str,
+        dst: str,
+        latency: Optional[Latency] = None,
+        bandwidth: Optional[float] = None,
+        drop_rate: Optional[float] = None,
+        dup_rate: Optional[float] = None,
+    ):
+        """
+        Overrides properties of the link from src to dst.
+        """
+        self._links[(src, dst)] = Link(latency, bandwidth, drop_rate, dup_rate)
+
+    def partition(self, groups: Iterable[Iterable[str]]):
+        """
+        Splits processes into groups, messages between different groups are dropped.
+        Processes not listed in any group can only talk to each other.
+        """
+        self._groups = dict()
+        for index, group in enumerate(groups):
+            for proc_id in group:
+                self._groups[proc_id] = index
+
+    def disconnect(self, a: str, b: str):
+        """
+        Drops all messages between two processes in both directions.
+        """
+        self._disconnected.add(frozenset((a, b)))
+
+    def connect(self, a: str, b: str):
+        self._disconnected.discard(frozenset((a, b)))
+
+    def heal(self):
+        """
+        Removes all partitions and disconnections.
+        """
+        self._groups = None
+        self._disconnected.clear()
+
+    def is_connected(self, src: str, dst: str) -> bool:
+        if self._groups is not None and self._groups.get(src, -1) != self._groups.get(dst, -1):
+            return False
+        return not self._disconnected or frozenset((src, dst)) not in self._disconnected
+
+    def deliveries(self, src: str, dst: str, size: int, time: float) -> List[float]:
+        """
+        Returns delays of deliveries of a message sent at the given time:
+        empty if it is dropped and two delays if it is duplicated.
+        """
+        self.sent_count += 1
+        self.bytes_sent += size
+        if not self.is_connected(src, dst):
+            self.dropped_count += 1
+            return []
+        link = self._links.get((src, dst))
+        default = self._default
+        if link is None:
+            link = default
+        drop_rate = default.drop_rate if link.drop_rate is None else link.drop_rate
+        if drop_rate > 0 and self._rng.uniform01() < drop_rate:
+            self.dropped_count += 1
+            return []
+        latency = link.latency or default.latency
+        bandwidth = link.bandwidth if link.bandwidth is not None else default.bandwidth
+
+        delay = latency.sample(self._rng)
+        if bandwidth is not None:
+            start = max(time, self._busy.get((src, dst), time))
+            finish = start + size / bandwidth
+            self._busy[(src, dst)] = finish
+            delay += finish - time
+        dup_rate = default.dup_rate if link.dup_rate is None else link.dup_rate
+        if dup_rate > 0 and self._rng.uniform01() < dup_rate:
+            self.duplicated_count += 1
+            return [delay, delay + latency.sample(self._rng)]
+        return [delay]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sent": self.sent_count,
+            "dropped": self.dropped_count,
+            "duplicated": self.duplicated_count,
+            "bytes": self.bytes_sent,
+        }
+
@@ -0,0 +1,400 @@
+"""
+Asyncio runtime that runs dslabmp processes as real networked nodes.
+
+Messages between nodes are sent as UDP datagrams or length-prefixed frames over TCP,
+timers are mapped to loop.call_later and local messages are exchanged through a UDP control socket.
+
+Usage:
+    python dslabnode.py --impl ../08-kv-replication/solution.py --cls StorageNode \\
+        --peers 0=127.0.0.1:9000,1=127.0.0.1:9001,2=127.0.0.1:9002 --args '["{id}", ["0", "1", "2"]]' \\
+        --control-base 9100
+
+The "{id}" placeholder in --args is replaced by the node id. Every node of --peers
+(or the ones listed in --ids) is started, nodes are spread over --workers OS processes.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from dslabmp import ENVELOPE_TYPE, TRANSPORT_JSON, Context, Message, Process, decode_message, unpack_envelope
+from dslabprof import Profiler
+
+
+Address = Tuple[str, int]
+
+PROTOCOL_UDP = "udp"
+PROTOCOL_TCP = "tcp"
+
+# maximum payload of a UDP datagram over IPv4
+MAX_DATAGRAM = 65507
+
+_FRAME_HEADER = struct.Struct("!I")
+
+
+class Node:
+    """
+    Runs a single process on the current event loop.
+
+    Local messages produced by the process are put to the local_messages queue,
+    passed to on_local if it is set and sent back to the last control socket client.
+    The queue holds up to local_queue_size messages (0 is unbounded), messages that do not fit
+    are dropped and counted in dropped_local_count. With local_queue_size None there is no queue.
+    """
+
+    def __init__(
+        self,
+        proc_id: str,
+        proc: Process,
+        peers: Dict[str, Address],
+        protocol: str = PROTOCOL_UDP,
+        control: Optional[Address] = None,
+        coalesce: bool = False,
+        profiler: Optional[Profiler] = None,
+        on_local: Optional[Callable[[Message], None]] = None,
+        local_queue_size: Optional[int] = 0,
+    ):
+        if protocol not in (PROTOCOL_UDP, PROTOCOL_TCP):
+            raise ValueError('unknown protocol {}'.format(protocol))
+        self._id = proc_id
+        self._proc = proc
+        self._peers = peers
+        self._protocol = protocol
+        self._control = control
+        self._coalesce = coalesce
+        self._profiler = profiler
+        self._on_local = on_local
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timers: Dict[str, asyncio.TimerHandle] = dict()
+        self._udp: Optional[asyncio.DatagramTransport] = None
+        self._control_transport: Optional[asyncio.DatagramTransport] = None
+        self._control_client: Optional[Address] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._links: Dict[str, _TcpLink] = dict()
+        self._incoming: Set[asyncio.StreamWriter] = set()
+        self.local_messages: Optional[asyncio.Queue] = None
+        if local_queue_size is not None:
+            self.local_messages = asyncio.Queue(maxsize=local_queue_size)
+        self.sent_count = 0
+        self.received_count = 0
+        self.dropped_count = 0
+        self.dropped_local_count = 0
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        host, port = self._peers[self._id]
+        if self._protocol == PROTOCOL_UDP:
+            self._udp, _ = await self._loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self._on_datagram), local_addr=(host, port)
+            )
+        else:
+            self._server = await asyncio.start_server(self._on_connection, host, port)
+        if self._control is not None:
+            self._control_transport, _ = await self._loop.create_datagram_endpoint(
+                lambda: _DatagramProtocol(self._on_control), local_addr=self._control
+            )
+        ctx = self._context()
+        self._proc.on_start(ctx)
+        self._apply(ctx)
+
+    async def stop(self):
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        if self._udp is not None:
+            self._udp.close()
+        if self._control_transport is not None:
+            self._control_transport.close()
+        for link in self._links.values():
+            link.close()
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._incoming):
+                writer.close()
+            await self._server.wait_closed()
+            # let connection handlers see EOF and exit
+            await asyncio.sleep(0)
+
+    def send_local_message(self, msg: Message):
+        """
+        Passes a local message to the process.
+        """
+        ctx = self._context()
+        if self._profiler is None:
+            self._proc.on_local_message(msg, ctx)
+        else:
+            self._profiler.measure(self._proc, "on_local_message", msg.type, ctx, self._proc.on_local_message, msg)
+        self._apply(ctx)
+
+    def _context(self) -> Context:
+        return Context(time.time(), TRANSPORT_JSON, False, self._coalesce)
+
+    def _on_message(self, msg_type: str, data: Any, sender: str):
+        self.received_count += 1
+        if msg_type == ENVELOPE_TYPE:
+            for inner_type, inner_data in unpack_envelope(data):
+                self._on_message(inner_type, inner_data, sender)
+            return
+        ctx = self._context()
+        msg = decode_message(msg_type, data)
+        if self._profiler is None:
+            self._proc.on_message(msg, sender, ctx)
+        else:
+            self._profiler.measure(self._proc, "on_message", msg_type, ctx, self._proc.on_message, msg, sender)
+        self._apply(ctx)
+
+    def _on_timer(self, timer_name: str):
+        self._timers.pop(timer_name, None)
+        ctx = self._context()
+        if self._profiler is None:
+            self._proc.on_timer(timer_name, ctx)
+        else:
+            self._profiler.measure(self._proc, "on_timer", timer_name, ctx, self._proc.on_timer, timer_name)
+        self._apply(ctx)
+
+    def _apply(self, ctx: Context):
+        ctx._flush()
+        for msg_type, payload, to in ctx._sent_messages:
+            self._send(msg_type, payload, to)
+
+        for msg_type, payload in ctx._sent_local_messages:
+            msg = decode_message(msg_type, payload)
+            if self.local_messages is not None:
+                if self.local_messages.full():
+                    self.dropped_local_count += 1
+                else:
+                    self.local_messages.put_nowait(msg)
+            if self._on_local is not None:
+                self._on_local(msg)
+            if self._control_client is not None:
+                data = '{{"type":{},"data":{}}}'.format(json.dumps(msg_type), payload).encode("utf8")
+                self._control_transport.sendto(data, self._control_client)
+
+        for timer_name, delay, once in ctx._timer_actions:
+            handle = self._timers.get(timer_name)
+            if once and handle is not None:
+                continue
+            if handle is not None:
+                handle.cancel()
+                del self._timers[timer_name]
+            if delay >= 0:
+                self._timers[timer_name] = self._loop.call_later(delay, self._on_timer, timer_name)
+
+    def _send(self, msg_type: str, payload: str, to: str):
+        if to not in self._peers:
+            raise ValueError('unknown destination process {}'.format(to))
+        data = "[{},{},{}]".format(json.dumps(self._id), json.dumps(msg_type), payload).encode("utf8")
+        self.sent_count += 1
+        if self._protocol == PROTOCOL_UDP:
+            if len(data) > MAX_DATAGRAM:
+                # too large for a datagram, behaves as a network drop
+                self.dropped_count += 1
+                return
+            self._udp.sendto(data, self._peers[to])
+        else:
+            link = self._links.get(to)
+            if link is None:
+                link = self._links[to] = _TcpLink(self._peers[to])
+            link.send(_FRAME_HEADER.pack(len(data)) + data)
+
+    def _on_datagram(self, data: bytes, addr: Address):
+        sender, msg_type, payload = json.loads(data)
+        self._on_message(msg_type, payload, sender)
+
+    def _on_control(self, data: bytes, addr: Address):
+        self._control_client = addr
+        request = json.loads(data)
+        self.send_local_message(Message(request["type"], request.get("data", {})))
+
+    async def _on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._incoming.add(writer)
+        try:
+            while True:
+                header = await reader.readexactly(_FRAME_HEADER.size)
+                (size,) = _FRAME_HEADER.unpack(header)
+                sender, msg_type, payload = json.loads(await reader.readexactly(size))
+                self._on_message(msg_type, payload, sender)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._incoming.discard(writer)
+            writer.close()
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback: Callable[[bytes, Address], None]):
+        self._callback = callback
+
+    def datagram_received(self, data: bytes, addr: Address):
+        self._callback(data, addr)
+
+
+class _TcpLink:
+    # outgoing connection to a peer, frames are buffered until the connection is established
+    def __init__(self, addr: Address):
+        self._addr = addr
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: List[bytes] = []
+        self._connecting: Optional[asyncio.Task] = None
+
+    def send(self, frame: bytes):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write(frame)
+            return
+        self._pending.append(frame)
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(self._connect())
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._connecting is not None:
+            self._connecting.cancel()
+
+    async def _connect(self):
+        try:
+            _, self._writer = await asyncio.open_connection(*self._addr)
+            self._writer.write(b"".join(self._pending))
+        except OSError:
+            # peer is not reachable, pending frames are lost like with a network drop
+            self._writer = None
+        self._pending = []
+        self._connecting = None
+
+
+def load_module(path: str, module_name: Optional[str] = None):
+    """
+    Loads a Python file as a module registered in sys.modules, so that pickle finds the classes
+    defined there when process state is saved. A module is loaded once, later calls return it.
+    By default the name is derived from the absolute path, so files with equal names do not clash.
+    """
+    path = os.path.abspath(path)
+    if module_name is None:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        module_name = "dslab_impl_{}_{}".format(stem, hashlib.sha1(path.encode("utf8")).hexdigest()[:8])
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def load_process_class(impl_path: str, class_name: str) -> type:
+    """
+    Loads a process class from a solution file, dslabmp has to be importable.
+    """
+    return getattr(load_module(impl_path), class_name)
+
+
+def parse_peers(spec: str) -> Dict[str, Address]:
+    peers = dict()
+    for item in spec.split(","):
+        proc_id, addr = item.split("=")
+        host, port = addr.rsplit(":", 1)
+        peers[proc_id] = (host, int(port))
+    return peers
+
+
+def _build_args(args_template: List[Any], proc_id: str) -> List[Any]:
+    return json.loads(json.dumps(args_template).replace("{id}", proc_id))
+
+
+async def _serve(options: Dict[str, Any], proc_ids: List[str]):
+    cls = load_process_class(options["impl"], options["cls"])
+    nodes = []
+    for proc_id in proc_ids:
+        control = None
+        if options["control_base"] is not None:
+            control = (options["host"], options["control_base"] + options["all_ids"].index(proc_id))
+        proc = cls(*_build_args(options["args"], proc_id))
+        # local messages go to the control socket client, nothing reads the queue here
+        node = Node(
+            proc_id, proc, options["peers"], options["protocol"], control, options["coalesce"], local_queue_size=None
+        )
+        await node.start()
+        nodes.append(node)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for node in nodes:
+            await node.stop()
+
+
+def _run_shard(options: Dict[str, Any], proc_ids: List[str]):
+    try:
+        asyncio.run(_serve(options, proc_ids))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_cluster(options: Dict[str, Any], workers: int = 1):
+    """
+    Starts all nodes, spread over the given number of OS processes with one event loop each.
+    """
+    proc_ids = options["all_ids"]
+    workers = max(1, min(workers, len(proc_ids)))
+    shards = [proc_ids[i::workers] for i in range(workers)]
+    if workers == 1:
+        _run_shard(options, shards[0])
+        return
+    children = [multiprocessing.Process(target=_run_shard, args=(options, shard)) for shard in shards]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        for child in children:
+            child.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run dslabmp processes as networked nodes")
+    parser.add_argument("--impl", required=True, help="path to Python file with solution")
+    parser.add_argument("--cls", required=True, help="process class name")
+    parser.add_argument("--peers", required=True, help="comma-separated id=host:port list of all nodes")
+    parser.add_argument("--ids", help="comma-separated ids of nodes to run here (default: all)")
+    parser.add_argument("--args", default='["{id}"]', help="JSON list of constructor arguments")
+    parser.add_argument("--protocol", choices=[PROTOCOL_UDP, PROTOCOL_TCP], default=PROTOCOL_UDP)
+    parser.add_argument("--control-base", type=int, help="first port of control sockets")
+    parser.add_argument("--host", default="127.0.0.1", help="host of control sockets")
+    parser.add_argument("--coalesce", action="store_true")
+    parser.add_argument("--workers", type=int, default=1, help="number of OS processes")
+    args = parser.parse_args()
+
+    peers = parse_peers(args.peers)
+    options = {
+        "impl": args.impl,
+        "cls": args.cls,
+        "peers": peers,
+        "all_ids": args.ids.split(",") if args.ids else list(peers),
+        "args": json.loads(args.args),
+        "protocol": args.protocol,
+        "control_base": args.control_base,
+        "host": args.host,
+        "coalesce": args.coalesce,
+    }
+    run_cluster(options, args.workers)
+
+
+if __name__ == "__main__":
+    main()
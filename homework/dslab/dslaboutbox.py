@@ -0,0 +1,216 @@
+from __future__ import annotations
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterator, Tuple
+
+
+MAGIC = b"DSO1"
+
+# record kinds
+PUT = 1
+ACK = 2
+# next order at the moment of compaction, later records have greater orders
+BASE = 3
+
+# kind, order, text length, crc32 of the record without this field
+_RECORD = struct.Struct("<BQII")
+_HEAD = struct.Struct("<BQI")
+
+
+class Outbox:
+    """
+    Append-only log of unacknowledged messages of a sender, stored in a memory-mapped file.
+
+    put and ack append records to the mapping, so records survive a crash of the process as soon
+    as they return. commit flushes the mapping to disk once for a group of records: the flush is done
+    only when group_size records are appended since the previous one, so a crash of the whole machine
+    may lose the last records of an incomplete group. When acknowledged records take most of the log,
+    it is rewritten with live messages only.
+
+    An existing log is recovered on open: records are scanned up to the first incomplete or corrupted one,
+    live messages are available through messages() and the next unused order through next_order.
+    A pickled outbox carries its live messages, unpickling rewrites the log with them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        group_size: int = 64,
+        initial_size: int = 1 << 16,
+        compact_ratio: float = 0.25,
+    ):
+        if group_size < 1:
+            raise ValueError('group size must be positive, got {}'.format(group_size))
+        self._path = path
+        self._group_size = group_size
+        self._initial_size = initial_size
+        self._compact_ratio = compact_ratio
+        # offset and size of live PUT records by order
+        self._live: Dict[int, Tuple[int, int]] = dict()
+        self._live_bytes = 0
+        self.next_order = 0
+        self.pending = 0
+        self.commits = 0
+        self.compactions = 0
+
+        exists = os.path.exists(path) and os.path.getsize(path) >= len(MAGIC)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self._file.write(MAGIC)
+            self._file.truncate(initial_size)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError('not an outbox log: {}'.format(path))
+        self._offset = len(MAGIC)
+        self._recover()
+
+    def __reduce__(self):
+        # get_state pickles the live messages, set_state rewrites the log with them,
+        # so the log agrees with the restored message store of the sender
+        args = (self._path, self._group_size, self._initial_size, self._compact_ratio)
+        return _restore, (args, self.messages(), self.next_order)
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def messages(self) -> Dict[int, str]:
+        """
+        Returns texts of live (not acknowledged) messages by order.
+        """
+        mm = self._mm
+        return {
+            order: bytes(mm[offset + _RECORD.size:offset + size]).decode("utf8")
+            for order, (offset, size) in sorted(self._live.items())
+        }
+
+    def put(self, order: int, text: str):
+        offset, size = self._append(PUT, order, text.encode("utf8"))
+        self._live[order] = (offset, size)
+        self._live_bytes += size
+        self.next_order = max(self.next_order, order + 1)
+
+    def ack(self, order: int):
+        entry = self._live.pop(order, None)
+        if entry is None:
+            return
+        self._live_bytes -= entry[1]
+        self._append(ACK, order, b"")
+        if self._offset > self._initial_size // 2 and self._live_bytes < self._offset * self._compact_ratio:
+            self.compact()
+
+    def commit(self, force: bool = False) -> bool:
+        """
+        Flushes appended records to disk if a group is complete, returns whether a flush was done.
+        """
+        if self.pending == 0 or (not force and self.pending < self._group_size):
+            return False
+        self._mm.flush()
+        self.pending = 0
+        self.commits += 1
+        return True
+
+    def compact(self):
+        """
+        Rewrites the log with live messages only and atomically replaces the old one.
+        """
+        self._rewrite(self.messages(), self.next_order)
+        self.compactions += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        if not self._mm.closed:
+            if self.pending:
+                self._mm.flush()
+            self._mm.close()
+        self._file.close()
+
+    def _rewrite(self, messages: Dict[int, str], next_order: int):
+        tmp_path = self._path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(_record(BASE, next_order, b""))
+            for order, text in messages.items():
+                f.write(_record(PUT, order, text.encode("utf8")))
+            size = f.tell()
+            f.truncate(max(self._initial_size, 2 * size))
+            f.flush()
+            os.fsync(f.fileno())
+        self._mm.close()
+        self._file.close()
+        os.replace(tmp_path, self._path)
+        self._file = open(self._path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._offset = len(MAGIC)
+        self._live.clear()
+        self._live_bytes = 0
+        self.next_order = 0
+        self.pending = 0
+        self._recover()
+
+    def _recover(self):
+        for kind, order, offset, size in self._scan():
+            if kind == PUT:
+                self._live[order] = (offset, size)
+                self._live_bytes += size
+                self.next_order = max(self.next_order, order + 1)
+            elif kind == ACK:
+                entry = self._live.pop(order, None)
+                if entry is not None:
+                    self._live_bytes -= entry[1]
+            else:
+                self.next_order = max(self.next_order, order)
+            self._offset = offset + size
+        tail = self._mm[self._offset:self._offset + _RECORD.size]
+        if tail.count(0) != len(tail):
+            # a torn or corrupted record, clear the rest so that stale records are never read back
+            self._mm[self._offset:] = bytes(len(self._mm) - self._offset)
+
+    def _scan(self) -> Iterator[Tuple[int, int, int, int]]:
+        # yields valid records, the log ends at zeroed space left by preallocation or at a torn write
+        mm = self._mm
+        offset = self._offset
+        end = len(mm)
+        while offset + _RECORD.size <= end:
+            kind, order, length, crc = _RECORD.unpack_from(mm, offset)
+            size = _RECORD.size + length
+            if kind not in (PUT, ACK, BASE) or offset + size > end:
+                return
+            text = mm[offset + _RECORD.size:offset + size]
+            if zlib.crc32(text, zlib.crc32(_HEAD.pack(kind, order, length))) != crc:
+                return
+            yield kind, order, offset, size
+            offset += size
+
+    def _append(self, kind: int, order: int, text: bytes) -> Tuple[int, int]:
+        record = _record(kind, order, text)
+        offset = self._offset
+        if offset + len(record) > len(self._mm):
+            self._grow(offset + len(record))
+        self._mm[offset:offset + len(record)] = record
+        self._offset += len(record)
+        self.pending += 1
+        return offset, len(record)
+
+    def _grow(self, needed: int):
+        size = len(self._mm)
+        while size < needed:
+            size *= 2
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+
+
+def _restore(args: Tuple[str, int, int, float], messages: Dict[int, str], next_order: int) -> Outbox:
+    outbox = Outbox(*args)
+    outbox._rewrite(messages, next_order)
+    return outbox
+
+
+def _record(kind: int, order: int, text: bytes) -> bytes:
+    head = _HEAD.pack(kind, order, len(text))
+    return _RECORD.pack(kind, order, len(text), zlib.crc32(text, zlib.crc32(head))) + text
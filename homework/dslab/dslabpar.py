@@ -0,0 +1,155 @@
+from __future__ import annotations
+import os
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+# read-only state shared by all tasks of a worker, set once by the pool initializer
+_shared: Any = None
+
+
+class TaskResult:
+    __slots__ = ("name", "seed", "params", "metrics", "error", "seconds")
+
+    def __init__(
+        self,
+        name: str,
+        seed: int,
+        params: Dict[str, Any],
+        metrics: Optional[Dict[str, Any]],
+        error: Optional[str],
+        seconds: float,
+    ):
+        self.name = name
+        self.seed = seed
+        self.params = params
+        self.metrics = metrics
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class SweepResult:
+    """
+    Results of independent tasks in submission order with aggregated metrics.
+    """
+
+    def __init__(self, results: List[TaskResult], wall_seconds: float, workers: int):
+        self.results = results
+        self.wall_seconds = wall_seconds
+        self.workers = workers
+
+    @property
+    def failures(self) -> List[TaskResult]:
+        return [res for res in self.results if not res.ok]
+
+    @property
+    def task_seconds(self) -> float:
+        """
+        Total time of tasks as if they were run serially.
+        """
+        return sum(res.seconds for res in self.results)
+
+    def aggregate(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns count, sum, mean, min and max of every numeric metric over successful tasks.
+        Booleans are counted as 0/1, so the mean of a check is the share of tasks passing it.
+        """
+        values: Dict[str, List[float]] = dict()
+        for res in self.results:
+            if not res.ok:
+                continue
+            for key, value in res.metrics.items():
+                if isinstance(value, (bool, int, float)):
+                    values.setdefault(key, []).append(float(value))
+        summary = dict()
+        for key, items in values.items():
+            summary[key] = {
+                "count": len(items),
+                "sum": sum(items),
+                "mean": sum(items) / len(items),
+                "min": min(items),
+                "max": max(items),
+            }
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "wall_seconds": self.wall_seconds,
+            "task_seconds": self.task_seconds,
+            "aggregate": self.aggregate(),
+            "results": [res.to_dict() for res in self.results],
+        }
+
+
+def shared_state() -> Any:
+    """
+    Returns the read-only state passed to run_tasks, available inside task functions.
+    """
+    return _shared
+
+
+def run_tasks(
+    fn: Callable[..., Dict[str, Any]],
+    seeds: Iterable[int],
+    params: Optional[Iterable[Dict[str, Any]]] = None,
+    shared: Any = None,
+    workers: Optional[int] = None,
+    name: Optional[str] = None,
+) -> SweepResult:
+    """
+    Runs fn(seed, **params) for every combination of seed and params in a pool of worker processes.
+
+    fn has to be a module-level function returning a dict of metrics. Before every task
+    the random module is seeded with the task seed, so processes relying on it
+    (e.g. GroupMember) behave the same regardless of the worker and task order.
+    shared is sent to every worker once and is returned by shared_state().
+    Exceptions are reported as failed tasks and do not stop the sweep.
+    With workers=1 tasks run in the current process.
+    """
+    global _shared
+    name = name or getattr(fn, "__name__", "task")
+    tasks = [(name, seed, dict(task_params)) for seed in seeds for task_params in (params or [dict()])]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(tasks)))
+
+    start = time.perf_counter()
+    if workers == 1:
+        prev_shared, _shared = _shared, shared
+        try:
+            results = [_run_task(fn, *task) for task in tasks]
+        finally:
+            _shared = prev_shared
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+            futures = [pool.submit(_run_task, fn, *task) for task in tasks]
+            results = [future.result() for future in futures]
+    return SweepResult(results, time.perf_counter() - start, workers)
+
+
+def _init_worker(shared: Any):
+    global _shared
+    _shared = shared
+
+
+def _run_task(fn: Callable[..., Dict[str, Any]], name: str, seed: int, params: Dict[str, Any]) -> TaskResult:
+    random.seed(seed)
+    start = time.perf_counter()
+    try:
+        metrics = fn(seed, **params)
+        error = None
+    except Exception:
+        metrics = None
+        error = traceback.format_exc()
+    return TaskResult(name, seed, params, metrics, error, time.perf_counter() - start)
@@ -0,0 +1,103 @@
+from __future__ import annotations
+import json
+import re
+import time
+from typing import Any, Callable, Dict, Tuple
+
+from dslabmp import Context, Process
+
+
+class HandlerStats:
+    __slots__ = ("calls", "seconds", "messages_sent", "bytes_sent", "local_messages", "timers_set", "timers_cancelled")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.local_messages = 0
+        self.timers_set = 0
+        self.timers_cancelled = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Profiler:
+    """
+    Collects per-handler statistics of process dispatch.
+
+    Statistics are keyed by (process class, handler, message type or timer name).
+    Digits in timer names are replaced with # so per-message timers like "17" or "pingfailed_3"
+    are aggregated together. Sent bytes are only known for the json transport.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._stats: Dict[Tuple[str, str, str], HandlerStats] = dict()
+
+    def measure(self, proc: Process, handler: str, key: str, ctx: Context, fn: Callable, *args):
+        """
+        Calls fn(*args, ctx) and records its wall-clock time and the effects left in ctx.
+        """
+        if handler == "on_timer":
+            key = re.sub(r"\d+", "#", key)
+        start = self._clock()
+        try:
+            fn(*args, ctx)
+        finally:
+            self.record(type(proc).__name__, handler, key, self._clock() - start, ctx)
+
+    def record(self, proc_class: str, handler: str, key: str, seconds: float, ctx: Context):
+        stats = self._stats.get((proc_class, handler, key))
+        if stats is None:
+            stats = self._stats[(proc_class, handler, key)] = HandlerStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        for _, payload, _ in ctx._sent_messages:
+            stats.messages_sent += 1
+            if isinstance(payload, str):
+                stats.bytes_sent += len(payload)
+        for messages in ctx._outbox.values():
+            for _, payload in messages:
+                stats.messages_sent += 1
+                if isinstance(payload, str):
+                    stats.bytes_sent += len(payload)
+        stats.local_messages += len(ctx._sent_local_messages)
+        for _, delay, _ in ctx._timer_actions:
+            if delay < 0:
+                stats.timers_cancelled += 1
+            else:
+                stats.timers_set += 1
+
+    def reset(self):
+        self._stats.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Returns statistics as a JSON-serializable dict, handlers are sorted by total time.
+        """
+        handlers = []
+        for (proc_class, handler, key), stats in sorted(self._stats.items(), key=lambda item: -item[1].seconds):
+            entry = {"process": proc_class, "handler": handler, "key": key}
+            entry.update(stats.to_dict())
+            handlers.append(entry)
+        return {
+            "total_calls": sum(stats.calls for stats in self._stats.values()),
+            "total_seconds": sum(stats.seconds for stats in self._stats.values()),
+            "handlers": handlers,
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_collapsed(self, path: str):
+        """
+        Writes stacks in the collapsed format of flamegraph.pl and speedscope,
+        one "process;handler;key microseconds" line per handler.
+        """
+        with open(path, "w") as f:
+            for (proc_class, handler, key), stats in sorted(self._stats.items()):
+                frames = ";".join(part.replace(";", "_").replace(" ", "_") for part in (proc_class, handler, key))
+                f.write("{} {}\n".format(frames, int(stats.seconds * 1e6)))
@@ -0,0 +1,292 @@
+from __future__ import annotations
+import heapq
+import json
+import random
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from dslabmp import ENVELOPE_TYPE, TRANSPORT_JSON, Context, Message, Process, decode_message, unpack_envelope
+from dslabnet import NetworkModel
+from dslabprof import Profiler
+from dslabtimers import TimerHeap, TimerWheel
+from dslabtrace import TraceWriter
+
+
+TIMER_BACKENDS = {"heap": TimerHeap, "wheel": TimerWheel}
+
+
+class Simulation:
+    """
+    Discrete-event runtime for dslabmp processes inside a single interpreter.
+
+    Message deliveries are kept in a heap and timers in a timer backend (see TIMER_BACKENDS),
+    both ordered by virtual time, so Context.time() returns simulated time and no wall-clock waiting happens.
+    The transport argument selects how Context passes payloads (see dslabmp.TRANSPORTS),
+    validate enables JSON-serializability checks for the ref transport,
+    coalesce packs messages sent by one handler to the same destination into one envelope.
+    If profiler is given, every handler call is measured by it.
+    If tracer is given, handler inputs and their effects are written to it.
+    If network is given, it decides message delays, drops and duplicates instead of
+    the uniform delay of set_delays.
+    """
+
+    def __init__(
+        self,
+        seed: int = 123,
+        min_delay: float = 1.0,
+        max_delay: float = 1.0,
+        transport: str = TRANSPORT_JSON,
+        validate: bool = False,
+        coalesce: bool = False,
+        timers: Union[str, TimerHeap, TimerWheel] = "heap",
+        profiler: Optional[Profiler] = None,
+        tracer: Optional[TraceWriter] = None,
+        network: Optional[NetworkModel] = None,
+    ):
+        self._rand = random.Random(seed)
+        self._transport = transport
+        self._validate = validate
+        self._coalesce = coalesce
+        self._profiler = profiler
+        self._tracer = tracer
+        self._network = network
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._time = 0.0
+        self._seq = 0
+        self._events: List[Tuple[float, int, str, Any]] = []
+        self._timers = TIMER_BACKENDS[timers]() if isinstance(timers, str) else timers
+        # expired timers waiting to fire, (proc_id, timer_name) -> deadline
+        self._due: OrderedDict[Tuple[str, str], float] = OrderedDict()
+        self._processes: Dict[str, Process] = dict()
+        self._local_messages: Dict[str, List[Message]] = dict()
+        # processes added since the last event, they are started before the next one
+        self._unstarted: List[str] = []
+        self._event_count = 0
+        self._message_count = 0
+        self._traffic = 0
+
+    def add_process(self, proc_id: str, proc: Process):
+        """
+        Adds a process with the specified id to the simulation.
+        The process is started before the next event, so processes added together can message each other on start.
+        """
+        if proc_id in self._processes:
+            raise ValueError('process {} already exists'.format(proc_id))
+        self._processes[proc_id] = proc
+        self._local_messages[proc_id] = list()
+        self._unstarted.append(proc_id)
+
+    def process(self, proc_id: str) -> Process:
+        """
+        Returns the process with the specified id.
+        """
+        return self._processes[proc_id]
+
+    def set_delay(self, delay: float):
+        """
+        Sets a fixed network delay.
+        """
+        self.set_delays(delay, delay)
+
+    def set_delays(self, min_delay: float, max_delay: float):
+        """
+        Sets network delay to be sampled uniformly from [min_delay, max_delay].
+        """
+        if min_delay < 0 or max_delay < min_delay:
+            raise ValueError('invalid delay range [{}, {}]'.format(min_delay, max_delay))
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+
+    def time(self) -> float:
+        """
+        Returns the current simulation time.
+        """
+        return self._time
+
+    @property
+    def network(self) -> Optional[NetworkModel]:
+        return self._network
+
+    @property
+    def event_count(self) -> int:
+        return self._event_count
+
+    @property
+    def message_count(self) -> int:
+        return self._message_count
+
+    @property
+    def traffic(self) -> int:
+        """
+        Total size of serialized payloads in UTF-8 bytes, only counted for the json transport.
+        """
+        return self._traffic
+
+    def send_local_message(self, proc_id: str, msg: Message):
+        """
+        Delivers a local message to the process immediately at the current time.
+        """
+        self._start_processes()
+        proc = self._processes[proc_id]
+        if self._tracer is not None:
+            self._tracer.record_local_in(self._time, proc_id, msg)
+        ctx = self._context()
+        if self._profiler is None:
+            proc.on_local_message(msg, ctx)
+        else:
+            self._profiler.measure(proc, "on_local_message", msg.type, ctx, proc.on_local_message, msg)
+        self._apply(proc_id, ctx)
+        if self._tracer is not None:
+            self._tracer.after_event(self._time, self._processes)
+
+    def read_local_messages(self, proc_id: str) -> List[Message]:
+        """
+        Returns local messages produced by the process since the previous call.
+        """
+        messages = self._local_messages[proc_id]
+        self._local_messages[proc_id] = list()
+        return messages
+
+    def step(self) -> bool:
+        """
+        Processes the next event. Returns False if there are no pending events.
+        """
+        next_time = self._next_event_time()
+        if next_time is None:
+            return False
+        self._time = next_time
+        self._event_count += 1
+        if not self._events or self._events[0][0] > next_time:
+            (proc_id, timer_name), _ = self._due.popitem(last=False)
+            proc = self._processes[proc_id]
+            if self._tracer is not None:
+                self._tracer.record_timer_fire(self._time, proc_id, timer_name)
+            ctx = self._context()
+            if self._profiler is None:
+                proc.on_timer(timer_name, ctx)
+            else:
+                self._profiler.measure(proc, "on_timer", timer_name, ctx, proc.on_timer, timer_name)
+            self._apply(proc_id, ctx)
+            if self._tracer is not None:
+                self._tracer.after_event(self._time, self._processes)
+            return True
+
+        _, _, proc_id, (msg_type, data, sender) = heapq.heappop(self._events)
+        proc = self._processes[proc_id]
+        if msg_type == ENVELOPE_TYPE:
+            for inner_type, inner_data in unpack_envelope(data):
+                self._deliver(proc_id, proc, inner_type, inner_data, sender)
+        else:
+            self._deliver(proc_id, proc, msg_type, data, sender)
+        if self._tracer is not None:
+            self._tracer.after_event(self._time, self._processes)
+        return True
+
+    def steps(self, count: int) -> int:
+        """
+        Processes up to count events and returns the number of processed events.
+        """
+        processed = 0
+        while processed < count and self.step():
+            processed += 1
+        return processed
+
+    def step_until_no_events(self, max_events: Optional[int] = None) -> int:
+        """
+        Processes events until the queue is empty or max_events events are processed.
+        """
+        processed = 0
+        while (max_events is None or processed < max_events) and self.step():
+            processed += 1
+        return processed
+
+    def step_until_time(self, time: float) -> int:
+        """
+        Processes all events scheduled not later than the specified time.
+        """
+        processed = 0
+        while True:
+            next_time = self._next_event_time()
+            if next_time is None or next_time > time:
+                break
+            self.step()
+            processed += 1
+        self._time = max(self._time, time)
+        return processed
+
+    def _start_processes(self):
+        while self._unstarted:
+            proc_id = self._unstarted.pop(0)
+            ctx = self._context()
+            self._processes[proc_id].on_start(ctx)
+            self._apply(proc_id, ctx)
+
+    def _next_event_time(self) -> Optional[float]:
+        self._start_processes()
+        # messages go first when a message and a timer are due at the same time
+        message_time = self._events[0][0] if self._events else None
+        if not self._due:
+            timer_time = self._timers.next_deadline()
+            if timer_time is None:
+                return message_time
+            if message_time is not None and message_time <= timer_time:
+                return message_time
+            for deadline, key, _ in self._timers.pop_expired(timer_time):
+                self._due[key] = deadline
+        timer_time = next(iter(self._due.values()))
+        if message_time is not None and message_time <= timer_time:
+            return message_time
+        return timer_time
+
+    def _deliver(self, proc_id: str, proc: Process, msg_type: str, data: Any, sender: str):
+        if self._tracer is not None:
+            self._tracer.record_deliver(self._time, proc_id, sender, msg_type, data)
+        ctx = self._context()
+        msg = decode_message(msg_type, data)
+        if self._profiler is None:
+            proc.on_message(msg, sender, ctx)
+        else:
+            self._profiler.measure(proc, "on_message", msg_type, ctx, proc.on_message, msg, sender)
+        self._apply(proc_id, ctx)
+
+    def _context(self) -> Context:
+        return Context(self._time, self._transport, self._validate, self._coalesce)
+
+    def _push(self, time: float, proc_id: str, payload: Any):
+        self._seq += 1
+        heapq.heappush(self._events, (time, self._seq, proc_id, payload))
+
+    def _apply(self, proc_id: str, ctx: Context):
+        ctx._flush()
+        if self._tracer is not None:
+            self._tracer.record_effects(self._time, proc_id, ctx)
+        for msg_type, data, to in ctx._sent_messages:
+            if to not in self._processes:
+                raise ValueError('unknown destination process {}'.format(to))
+            self._message_count += 1
+            # traffic and bandwidth are charged in UTF-8 bytes of the JSON payload
+            if isinstance(data, str):
+                self._traffic += len(data.encode("utf8"))
+            if self._network is None:
+                delay = self._rand.uniform(self._min_delay, self._max_delay)
+                self._push(self._time + delay, to, (msg_type, data, proc_id))
+                continue
+            size = len((data if isinstance(data, str) else json.dumps(data)).encode("utf8"))
+            for delay in self._network.deliveries(proc_id, to, size, self._time):
+                self._push(self._time + delay, to, (msg_type, data, proc_id))
+
+        local_messages = self._local_messages[proc_id]
+        for msg_type, data in ctx._sent_local_messages:
+            local_messages.append(decode_message(msg_type, data))
+
+        for timer_name, delay, once in ctx._timer_actions:
+            key = (proc_id, timer_name)
+            if once and (key in self._timers or key in self._due):
+                continue
+            # expired timers that have not fired yet are still active and can be cancelled or overridden
+            self._due.pop(key, None)
+            if delay < 0:
+                self._timers.cancel(key)
+            else:
+                self._timers.set(key, self._time + delay)
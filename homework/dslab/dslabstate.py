@@ -0,0 +1,257 @@
+from __future__ import annotations
+import math
+import pickle
+import struct
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Mapping, Optional
+
+from dslabmp import Process, state_fingerprint
+
+
+MAGIC = b"DSS1"
+FLAG_DELTA = 1
+FLAG_COMPRESSED = 2
+
+_HEADER = struct.Struct("<4sBI")
+_NAME = struct.Struct("<H")
+_DATA = struct.Struct("<I")
+_REMOVED = 0xFFFFFFFF
+
+
+class StateSnapshot:
+    """
+    Binary snapshot of process state: every process member is pickled separately.
+
+    Snapshots taken against a base reuse the base bytes objects for unchanged members,
+    so a chain of snapshots shares memory for everything that did not change.
+    """
+
+    __slots__ = ("members",)
+
+    def __init__(self, members: Dict[str, bytes]):
+        self.members = members
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, StateSnapshot) and self.members == other.members
+
+    def size(self) -> int:
+        return sum(len(name) + len(data) for name, data in self.members.items())
+
+    def changed_members(self, base: StateSnapshot) -> Dict[str, Optional[bytes]]:
+        """
+        Returns members that differ from the base snapshot, removed members map to None.
+        """
+        changes = dict()
+        for name, data in self.members.items():
+            prev = base.members.get(name)
+            if prev is not data and prev != data:
+                changes[name] = data
+        for name in base.members:
+            if name not in self.members:
+                changes[name] = None
+        return changes
+
+
+def take_snapshot(
+    proc: Process, base: Optional[StateSnapshot] = None, dirty: Optional[Iterable[str]] = None
+) -> StateSnapshot:
+    """
+    Captures the process state.
+    If dirty is given, only these members are pickled again and the rest is taken from base.
+    """
+    if dirty is not None:
+        if base is None:
+            raise ValueError('incremental snapshot requires a base snapshot')
+        members = dict(base.members)
+        for name in dirty:
+            if name in proc.__dict__:
+                members[name] = _share(pickle.dumps(proc.__dict__[name], pickle.HIGHEST_PROTOCOL), base, name)
+            else:
+                members.pop(name, None)
+        return StateSnapshot(members)
+
+    members = dict()
+    for name, member in proc.__dict__.items():
+        data = pickle.dumps(member, pickle.HIGHEST_PROTOCOL)
+        members[name] = data if base is None else _share(data, base, name)
+    return StateSnapshot(members)
+
+
+def restore_snapshot(proc: Process, snapshot: StateSnapshot):
+    """
+    Restores the process state from the snapshot, same as Process.set_state.
+    """
+    for name in proc.__dict__:
+        proc.__dict__[name] = None
+    for name, data in snapshot.members.items():
+        proc.__dict__[name] = pickle.loads(data)
+
+
+def encode_snapshot(snapshot: StateSnapshot, base: Optional[StateSnapshot] = None, compress: bool = False) -> bytes:
+    """
+    Serializes the snapshot, as a delta against base if it is given.
+    """
+    flags = 0
+    if base is None:
+        entries = snapshot.members
+    else:
+        entries = snapshot.changed_members(base)
+        flags |= FLAG_DELTA
+
+    chunks = []
+    for name, data in entries.items():
+        name_bytes = name.encode("utf8")
+        chunks.append(_NAME.pack(len(name_bytes)))
+        chunks.append(name_bytes)
+        if data is None:
+            chunks.append(_DATA.pack(_REMOVED))
+        else:
+            chunks.append(_DATA.pack(len(data)))
+            chunks.append(data)
+    body = b"".join(chunks)
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_COMPRESSED
+    return _HEADER.pack(MAGIC, flags, len(entries)) + body
+
+
+def decode_snapshot(data: bytes, base: Optional[StateSnapshot] = None) -> StateSnapshot:
+    """
+    Deserializes a snapshot produced by encode_snapshot.
+    Delta snapshots require the same base snapshot they were encoded against.
+    """
+    magic, flags, count = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('not a state snapshot')
+    body = memoryview(data)[_HEADER.size:]
+    if flags & FLAG_COMPRESSED:
+        body = memoryview(zlib.decompress(body))
+
+    if flags & FLAG_DELTA:
+        if base is None:
+            raise ValueError('delta snapshot requires a base snapshot')
+        members = dict(base.members)
+    else:
+        members = dict()
+
+    offset = 0
+    for _ in range(count):
+        (name_len,) = _NAME.unpack_from(body, offset)
+        offset += _NAME.size
+        name = bytes(body[offset:offset + name_len]).decode("utf8")
+        offset += name_len
+        (data_len,) = _DATA.unpack_from(body, offset)
+        offset += _DATA.size
+        if data_len == _REMOVED:
+            members.pop(name, None)
+        else:
+            members[name] = bytes(body[offset:offset + data_len])
+            offset += data_len
+    return StateSnapshot(members)
+
+
+def _share(data: bytes, base: StateSnapshot, name: str) -> bytes:
+    prev = base.members.get(name)
+    return prev if prev == data else data
+
+
+def system_state_hash(processes: Mapping[str, Process], dirty: Optional[Mapping[str, Iterable[str]]] = None) -> int:
+    """
+    Combines state hashes of processes keyed by id into one order-independent hash.
+    dirty maps process ids to members changed since the previous call, processes missing from it are not rehashed.
+    """
+    total = 0
+    for proc_id, proc in processes.items():
+        if dirty is None:
+            proc_hash = proc.state_hash()
+        else:
+            proc_hash = proc.state_hash(dirty.get(proc_id, ()))
+        total += state_fingerprint((proc_id, proc_hash))
+    return total & 0xFFFFFFFFFFFFFFFF
+
+
+class VisitedLRU:
+    """
+    Set of visited state hashes holding at most capacity most recently seen hashes.
+    Evicted states may be explored again, but never wrongly pruned.
+    """
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError('capacity has to be positive')
+        self._capacity = capacity
+        self._hashes: OrderedDict[int, None] = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def __contains__(self, state_hash: int) -> bool:
+        return state_hash in self._hashes
+
+    def add(self, state_hash: int) -> bool:
+        """
+        Marks the state as visited. Returns False if it has already been visited.
+        """
+        if state_hash in self._hashes:
+            self._hashes.move_to_end(state_hash)
+            return False
+        self._hashes[state_hash] = None
+        if len(self._hashes) > self._capacity:
+            self._hashes.popitem(last=False)
+            self.evicted += 1
+        return True
+
+
+class VisitedBloom:
+    """
+    Bloom filter of visited state hashes with fixed memory.
+    Up to capacity states the share of new states wrongly reported as visited is about error_rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        if capacity <= 0:
+            raise ValueError('capacity has to be positive')
+        if not 0 < error_rate < 1:
+            raise ValueError('error rate has to be in (0, 1)')
+        self._bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._probes = max(1, round(self._bits / capacity * math.log(2)))
+        self._array = bytearray((self._bits + 7) // 8)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, state_hash: int) -> bool:
+        array = self._array
+        for bit in self._positions(state_hash):
+            if not array[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def add(self, state_hash: int) -> bool:
+        """
+        Marks the state as visited. Returns False if it has (probably) already been visited.
+        """
+        array = self._array
+        new = False
+        for bit in self._positions(state_hash):
+            mask = 1 << (bit & 7)
+            if not array[bit >> 3] & mask:
+                array[bit >> 3] |= mask
+                new = True
+        if new:
+            self._count += 1
+        return new
+
+    def _positions(self, state_hash: int) -> Iterable[int]:
+        # double hashing over the two halves of the 64-bit state hash
+        h1 = state_hash & 0xFFFFFFFF
+        h2 = (state_hash >> 32) | 1
+        bits = self._bits
+        return [(h1 + i * h2) % bits for i in range(self._probes)]
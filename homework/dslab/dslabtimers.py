@@ -0,0 +1,285 @@
+from __future__ import annotations
+import heapq
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class TimerHeap:
+    """
+    Timer queue based on a binary heap with lazy deletion of cancelled timers.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._active: Dict[Hashable, Tuple[float, int, Any]] = dict()
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._active
+
+    def set(self, key: Hashable, deadline: float, payload: Any = None):
+        """
+        Schedules a timer, overriding the active timer with the same key.
+        """
+        self._seq += 1
+        self._active[key] = (deadline, self._seq, payload)
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+
+    def set_once(self, key: Hashable, deadline: float, payload: Any = None):
+        """
+        Schedules a timer unless there is an active timer with the same key.
+        """
+        if key not in self._active:
+            self.set(key, deadline, payload)
+
+    def cancel(self, key: Hashable):
+        self._active.pop(key, None)
+
+    def next_deadline(self) -> Optional[float]:
+        heap = self._heap
+        while heap:
+            deadline, seq, key = heap[0]
+            entry = self._active.get(key)
+            if entry is not None and entry[1] == seq:
+                return deadline
+            heapq.heappop(heap)
+        return None
+
+    def pop_expired(self, time: float) -> List[Tuple[float, Hashable, Any]]:
+        """
+        Removes and returns timers with deadline not later than time, ordered by deadline.
+        """
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] <= time:
+            deadline, seq, key = heapq.heappop(heap)
+            entry = self._active.get(key)
+            if entry is not None and entry[1] == seq:
+                del self._active[key]
+                expired.append((deadline, key, entry[2]))
+        return expired
+
+
+class _Bucket(dict):
+    # timers of a wheel slot or of the overflow by key, with a heap of (deadline, seq, key) to find the earliest one,
+    # the heap is built on the first query and entries of cancelled timers stay in it until they reach the top
+    __slots__ = ("heap",)
+
+    def __init__(self):
+        super().__init__()
+        self.heap: Optional[List[Tuple[float, int, Hashable]]] = None
+
+    def add(self, key: Hashable, entry: Tuple[float, int, Any]):
+        self[key] = entry
+        if self.heap is not None:
+            heapq.heappush(self.heap, (entry[0], entry[1], key))
+
+    def remove(self, key: Hashable):
+        del self[key]
+        if self.heap is not None and len(self.heap) > 2 * len(self) + 16:
+            self.heap = None
+
+    def earliest(self) -> Tuple[float, int, Hashable]:
+        heap = self.heap
+        if heap is None:
+            heap = self.heap = [(entry[0], entry[1], key) for key, entry in self.items()]
+            heapq.heapify(heap)
+        while True:
+            deadline, seq, key = heap[0]
+            entry = self.get(key)
+            if entry is not None and entry[1] == seq:
+                return heap[0]
+            heapq.heappop(heap)
+
+    def clear(self):
+        super().clear()
+        self.heap = None
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel with O(1) insertion and cancellation.
+
+    Time is split into ticks of the given resolution. Level 0 holds timers expiring within
+    the current rotation of its slots, level l holds timers within the current rotation of level l.
+    Timers beyond the last level are kept in an overflow bucket. When the wheel reaches a tick,
+    timers of its slot are moved to a small heap, so they fire at their exact deadlines.
+    Every bucket keeps a heap of its deadlines and the earliest timer is cached and checked lazily,
+    so cancelling or overriding timers does not rescan buckets.
+    """
+
+    def __init__(self, resolution: float = 0.1, slot_bits: int = 8, levels: int = 4):
+        if resolution <= 0:
+            raise ValueError('resolution has to be positive')
+        self._resolution = resolution
+        self._bits = slot_bits
+        self._mask = (1 << slot_bits) - 1
+        self._levels = levels
+        self._wheels: List[List[_Bucket]] = [[_Bucket() for _ in range(1 << slot_bits)] for _ in range(levels)]
+        self._overflow = _Bucket()
+        # timers of the ticks already reached, stale entries are skipped by seq
+        self._ready: List[Tuple[float, int, Hashable, Any]] = []
+        # key -> (level, bucket, seq) of the timer, level -1 stands for ready and levels for overflow
+        self._where: Dict[Hashable, Tuple[int, Optional[_Bucket], int]] = dict()
+        self._counts = [0] * (levels + 1)
+        self._now = 0
+        self._seq = 0
+        # (deadline, seq, key) of the earliest timer or None if unknown,
+        # it is stale once the timer with this key has another seq or is gone
+        self._next: Optional[Tuple[float, int, Hashable]] = None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._where
+
+    def set(self, key: Hashable, deadline: float, payload: Any = None):
+        """
+        Schedules a timer, overriding the active timer with the same key.
+        """
+        if key in self._where:
+            self.cancel(key)
+        self._seq += 1
+        self._place(key, (deadline, self._seq, payload))
+        if self._next is not None and deadline < self._next[0] and self._is_current(self._next):
+            self._next = (deadline, self._seq, key)
+
+    def set_once(self, key: Hashable, deadline: float, payload: Any = None):
+        """
+        Schedules a timer unless there is an active timer with the same key.
+        """
+        if key not in self._where:
+            self.set(key, deadline, payload)
+
+    def cancel(self, key: Hashable):
+        location = self._where.pop(key, None)
+        if location is None:
+            return
+        level, bucket, _ = location
+        if level >= 0:
+            bucket.remove(key)
+            self._counts[level] -= 1
+
+    def next_deadline(self) -> Optional[float]:
+        if not self._where:
+            return None
+        if self._next is None or not self._is_current(self._next):
+            self._next = self._find_next()
+        return self._next[0]
+
+    def _is_current(self, timer: Tuple[float, int, Hashable]) -> bool:
+        location = self._where.get(timer[2])
+        return location is not None and location[2] == timer[1]
+
+    def pop_expired(self, time: float) -> List[Tuple[float, Hashable, Any]]:
+        """
+        Removes and returns timers with deadline not later than time, ordered by deadline.
+        """
+        target = max(int(time / self._resolution), self._now)
+        expired: List[Tuple[float, Hashable, Any]] = []
+        wheel = self._wheels[0]
+        mask = self._mask
+        while True:
+            self._pop_ready(time, expired)
+            if self._now >= target:
+                break
+            if not self._where:
+                self._now = target
+                break
+            if self._counts[0] == 0 or (self._now & mask) == mask:
+                # nothing left in the current rotation of level 0, move to the next one
+                self._now = min(target, (self._now | mask) + 1)
+                if (self._now & mask) == 0:
+                    self._cascade()
+            else:
+                end = min(target, self._now | mask)
+                self._now += 1
+                while self._now < end and not wheel[self._now & mask]:
+                    self._now += 1
+            self._make_ready(wheel[self._now & mask])
+        return expired
+
+    def _find_next(self) -> Tuple[float, int, Hashable]:
+        ready = self._ready
+        while ready:
+            deadline, seq, key, _ = ready[0]
+            location = self._where.get(key)
+            if location is not None and location[0] < 0 and location[2] == seq:
+                return deadline, seq, key
+            heapq.heappop(ready)
+        now = self._now
+        for level in range(self._levels):
+            if not self._counts[level]:
+                continue
+            wheel = self._wheels[level]
+            start = (now >> (level * self._bits)) & self._mask
+            for slot in range(start, self._mask + 1):
+                bucket = wheel[slot]
+                if bucket:
+                    return bucket.earliest()
+        return self._overflow.earliest()
+
+    def _pop_ready(self, time: float, expired: List[Tuple[float, Hashable, Any]]):
+        ready = self._ready
+        where = self._where
+        while ready and ready[0][0] <= time:
+            deadline, seq, key, payload = heapq.heappop(ready)
+            location = where.get(key)
+            if location is not None and location[0] < 0 and location[2] == seq:
+                del where[key]
+                expired.append((deadline, key, payload))
+
+    def _make_ready(self, bucket: _Bucket):
+        if not bucket:
+            return
+        self._counts[0] -= len(bucket)
+        for key, (deadline, seq, payload) in bucket.items():
+            heapq.heappush(self._ready, (deadline, seq, key, payload))
+            self._where[key] = (-1, None, seq)
+        bucket.clear()
+
+    def _place(self, key: Hashable, entry: Tuple[float, int, Any]):
+        now = self._now
+        tick = int(entry[0] / self._resolution)
+        if tick <= now:
+            heapq.heappush(self._ready, (entry[0], entry[1], key, entry[2]))
+            self._where[key] = (-1, None, entry[1])
+            return
+        bits = self._bits
+        if (tick >> bits) == (now >> bits):
+            level = 0
+            bucket = self._wheels[0][tick & self._mask]
+        else:
+            for level in range(1, self._levels):
+                shift = (level + 1) * bits
+                if (tick >> shift) == (now >> shift):
+                    bucket = self._wheels[level][(tick >> (level * bits)) & self._mask]
+                    break
+            else:
+                level = self._levels
+                bucket = self._overflow
+        bucket.add(key, entry)
+        self._where[key] = (level, bucket, entry[1])
+        self._counts[level] += 1
+
+    def _cascade(self):
+        # moves timers of the rotation that has just started down to the lower levels
+        now = self._now
+        for level in range(1, self._levels):
+            slot = (now >> (level * self._bits)) & self._mask
+            self._redistribute(level, self._wheels[level][slot])
+            if slot != 0:
+                return
+        self._redistribute(self._levels, self._overflow)
+
+    def _redistribute(self, level: int, bucket: _Bucket):
+        if not bucket:
+            return
+        entries = list(bucket.items())
+        bucket.clear()
+        self._counts[level] -= len(entries)
+        for key, entry in entries:
+            self._place(key, entry)
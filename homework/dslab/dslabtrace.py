@@ -0,0 +1,277 @@
+from __future__ import annotations
+import json
+import mmap
+import struct
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from dslabmp import Context, Message, Process, decode_message
+
+
+MAGIC = b"DST1"
+INDEX_MAGIC = b"DSTI"
+
+# record kinds
+SEND = 1
+DELIVER = 2
+TIMER_SET = 3
+TIMER_CANCEL = 4
+TIMER_FIRE = 5
+LOCAL_IN = 6
+LOCAL_OUT = 7
+CHECKPOINT = 8
+
+KIND_NAMES = {
+    SEND: "send",
+    DELIVER: "deliver",
+    TIMER_SET: "timer_set",
+    TIMER_CANCEL: "timer_cancel",
+    TIMER_FIRE: "timer_fire",
+    LOCAL_IN: "local_in",
+    LOCAL_OUT: "local_out",
+    CHECKPOINT: "checkpoint",
+}
+
+# records that are inputs of process handlers, they are enough to replay a run
+INPUT_KINDS = (DELIVER, TIMER_FIRE, LOCAL_IN)
+
+# kind, time, process id length, payload length
+_RECORD = struct.Struct("<BdHI")
+_INDEX_ENTRY = struct.Struct("<dQ")
+# index offset, index entries, magic
+_TRAILER = struct.Struct("<QI4s")
+
+
+class TraceRecord:
+    __slots__ = ("kind", "time", "proc_id", "offset", "_payload")
+
+    def __init__(self, kind: int, time: float, proc_id: str, offset: int, payload: bytes):
+        self.kind = kind
+        self.time = time
+        self.proc_id = proc_id
+        self.offset = offset
+        self._payload = payload
+
+    def __repr__(self) -> str:
+        return "TraceRecord({}, {}, {}, {})".format(KIND_NAMES[self.kind], self.time, self.proc_id, self.data)
+
+    @property
+    def data(self) -> Any:
+        """
+        Decoded record payload:
+        send - [to, type, data], deliver - [sender, type, data], local_in and local_out - [type, data],
+        timer_set - [name, delay, once], timer_cancel and timer_fire - [name], checkpoint - {proc_id: state}.
+        """
+        if self.kind == CHECKPOINT:
+            return json.loads(zlib.decompress(self._payload))
+        return json.loads(bytes(self._payload))
+
+
+class TraceWriter:
+    """
+    Writes an append-only binary trace of a run.
+
+    Every record has a fixed header (kind, time, process id length, payload length)
+    followed by the process id and a JSON payload. Every checkpoint_interval events the states
+    of all processes are written as a checkpoint record. On close an index of checkpoint offsets
+    is appended, so readers can seek to checkpoints without scanning the whole file.
+    """
+
+    def __init__(self, path: str, checkpoint_interval: Optional[int] = 10000):
+        self._file = open(path, "wb", buffering=1 << 20)
+        self._file.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._interval = checkpoint_interval
+        self._events = 0
+        self._index: List[Tuple[float, int]] = []
+
+    def __enter__(self) -> TraceWriter:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_input(self, kind: int, time: float, proc_id: str, payload: str):
+        self._write(kind, time, proc_id, payload.encode("utf8"))
+
+    def record_deliver(self, time: float, proc_id: str, sender: str, msg_type: str, data: Any):
+        self.record_input(DELIVER, time, proc_id, "[{},{},{}]".format(
+            json.dumps(sender), json.dumps(msg_type), _json(data)
+        ))
+
+    def record_timer_fire(self, time: float, proc_id: str, timer_name: str):
+        self.record_input(TIMER_FIRE, time, proc_id, json.dumps([timer_name]))
+
+    def record_local_in(self, time: float, proc_id: str, msg: Message):
+        self.record_input(LOCAL_IN, time, proc_id, "[{},{}]".format(json.dumps(msg.type), json.dumps(msg._data)))
+
+    def record_effects(self, time: float, proc_id: str, ctx: Context):
+        """
+        Records messages, local messages and timer actions left in a flushed context.
+        """
+        for msg_type, data, to in ctx._sent_messages:
+            self._write(SEND, time, proc_id, "[{},{},{}]".format(
+                json.dumps(to), json.dumps(msg_type), _json(data)
+            ).encode("utf8"))
+        for msg_type, data in ctx._sent_local_messages:
+            self._write(LOCAL_OUT, time, proc_id, "[{},{}]".format(json.dumps(msg_type), _json(data)).encode("utf8"))
+        for timer_name, delay, once in ctx._timer_actions:
+            if delay < 0:
+                self._write(TIMER_CANCEL, time, proc_id, json.dumps([timer_name]).encode("utf8"))
+            else:
+                self._write(TIMER_SET, time, proc_id, json.dumps([timer_name, delay, once]).encode("utf8"))
+
+    def after_event(self, time: float, processes: Mapping[str, Process]):
+        """
+        Counts a processed event and writes a checkpoint when the interval is reached.
+        """
+        self._events += 1
+        if self._interval is not None and self._events % self._interval == 0:
+            self.checkpoint(time, processes)
+
+    def checkpoint(self, time: float, processes: Mapping[str, Process]):
+        states = {proc_id: proc.get_state() for proc_id, proc in processes.items()}
+        self._index.append((time, self._offset))
+        self._write(CHECKPOINT, time, "", zlib.compress(json.dumps(states).encode("utf8")))
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._offset
+        for time, offset in self._index:
+            self._file.write(_INDEX_ENTRY.pack(time, offset))
+        self._file.write(_TRAILER.pack(index_offset, len(self._index), INDEX_MAGIC))
+        self._file.close()
+
+    def _write(self, kind: int, time: float, proc_id: str, payload: bytes):
+        proc_bytes = proc_id.encode("utf8")
+        self._file.write(_RECORD.pack(kind, time, len(proc_bytes), len(payload)))
+        self._file.write(proc_bytes)
+        self._file.write(payload)
+        self._offset += _RECORD.size + len(proc_bytes) + len(payload)
+
+
+class TraceReader:
+    """
+    Reads a trace through mmap, so large traces are scanned without loading them into memory.
+    Traces that were not closed (e.g. after a crash) are read up to the last complete record
+    and their checkpoint index is rebuilt by a scan.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('not a dslab trace')
+        self._end = len(self._mm)
+        self._index: Optional[List[Tuple[float, int]]] = None
+        if self._end >= len(MAGIC) + _TRAILER.size:
+            index_offset, count, magic = _TRAILER.unpack_from(self._mm, self._end - _TRAILER.size)
+            if magic == INDEX_MAGIC and index_offset + count * _INDEX_ENTRY.size + _TRAILER.size == self._end:
+                self._index = [
+                    _INDEX_ENTRY.unpack_from(self._mm, index_offset + i * _INDEX_ENTRY.size) for i in range(count)
+                ]
+                self._end = index_offset
+
+    def __enter__(self) -> TraceReader:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def checkpoints(self) -> List[Tuple[float, int]]:
+        """
+        Returns (time, offset) of checkpoints in the trace.
+        """
+        if self._index is None:
+            self._index = [(rec.time, rec.offset) for rec in self.records(kinds=(CHECKPOINT,))]
+        return self._index
+
+    def records(
+        self,
+        start: Optional[int] = None,
+        kinds: Optional[Iterable[int]] = None,
+        proc_id: Optional[str] = None,
+        time_from: Optional[float] = None,
+        time_to: Optional[float] = None,
+    ) -> Iterator[TraceRecord]:
+        """
+        Iterates over records from the start offset matching the filters.
+        Filters are checked on record headers, payloads are only decoded on access.
+        """
+        mm = self._mm
+        offset = len(MAGIC) if start is None else start
+        kinds = None if kinds is None else set(kinds)
+        proc_bytes = None if proc_id is None else proc_id.encode("utf8")
+        header_size = _RECORD.size
+        while offset + header_size <= self._end:
+            kind, time, proc_len, payload_len = _RECORD.unpack_from(mm, offset)
+            body = offset + header_size
+            next_offset = body + proc_len + payload_len
+            if next_offset > self._end:
+                break
+            if time_to is not None and time > time_to:
+                break
+            if (
+                (kinds is None or kind in kinds)
+                and (time_from is None or time >= time_from)
+                and (proc_bytes is None or mm[body:body + proc_len] == proc_bytes)
+            ):
+                proc = mm[body:body + proc_len].decode("utf8")
+                yield TraceRecord(kind, time, proc, offset, mm[body + proc_len:next_offset])
+            offset = next_offset
+
+    def replay(
+        self,
+        processes: Dict[str, Process],
+        time_from: Optional[float] = None,
+        time_to: Optional[float] = None,
+        on_event: Optional[Callable[[TraceRecord, Context], None]] = None,
+    ) -> int:
+        """
+        Replays recorded handler inputs on the given processes and returns the number of replayed events.
+
+        The replay starts from the latest checkpoint not later than time_from, process states are
+        restored from it with Process.set_state. Without a suitable checkpoint the replay starts
+        from the beginning of the trace, so processes have to be in their initial state.
+        on_event is called with every replayed input and the context left by the handler.
+        """
+        start = None
+        if time_from is not None:
+            for time, offset in self.checkpoints():
+                if time > time_from:
+                    break
+                start = offset
+        if start is not None:
+            checkpoint = next(self.records(start=start))
+            for proc_id, state in checkpoint.data.items():
+                processes[proc_id].set_state(state)
+            start += _RECORD.size + len(checkpoint.proc_id) + len(checkpoint._payload)
+
+        count = 0
+        for rec in self.records(start=start, kinds=INPUT_KINDS, time_to=time_to):
+            proc = processes[rec.proc_id]
+            ctx = Context(rec.time)
+            data = rec.data
+            if rec.kind == DELIVER:
+                sender, msg_type, payload = data
+                proc.on_message(decode_message(msg_type, payload), sender, ctx)
+            elif rec.kind == TIMER_FIRE:
+                proc.on_timer(data[0], ctx)
+            else:
+                msg_type, payload = data
+                proc.on_local_message(decode_message(msg_type, payload), ctx)
+            ctx._flush()
+            if on_event is not None:
+                on_event(rec, ctx)
+            count += 1
+        return count
+
+
+def _json(data: Any) -> str:
+    # payloads of the json transport are already serialized
+    return data if isinstance(data, str) else json.dumps(data)